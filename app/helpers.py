@@ -1,7 +1,6 @@
 import base64
-import os
 import cv2
-import tempfile
+from utils.face_anti_spoofing_dep import open_video_capture
 
 def decode_base64_image(data_url: str) -> bytes:
     """
@@ -20,34 +19,23 @@ def read_file_storage(file_storage) -> bytes:
 
 def extract_middle_frame_from_video_bytes(video_bytes: bytes) -> bytes:
     """
-    Save video bytes to a temp file, grab a middle frame with OpenCV, return the frame as PNG bytes.
+    Grab a middle frame from in-memory video bytes with OpenCV, return the frame as PNG bytes.
     """
     if not video_bytes:
         return None
 
-    with tempfile.NamedTemporaryFile(suffix=".webm", delete=False) as tmp:
-        tmp.write(video_bytes)
-        tmp_path = tmp.name
-
-    try:
-        cap = cv2.VideoCapture(tmp_path)
+    with open_video_capture(video_bytes) as cap:
         if not cap.isOpened():
             return None
         frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
         mid_index = max(frame_count // 2, 0)
         cap.set(cv2.CAP_PROP_POS_FRAMES, mid_index)
         ok, frame = cap.read()
-        cap.release()
-        if not ok or frame is None:
-            return None
-        # Convert BGR -> RGB if your pipeline expects RGB; if it expects BGR, keep as is.
-        # Here we'll encode as PNG directly from BGR.
-        ok, buf = cv2.imencode(".png", frame)
-        if not ok:
-            return None
-        return buf.tobytes()
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
\ No newline at end of file
+    if not ok or frame is None:
+        return None
+    # Convert BGR -> RGB if your pipeline expects RGB; if it expects BGR, keep as is.
+    # Here we'll encode as PNG directly from BGR.
+    ok, buf = cv2.imencode(".png", frame)
+    if not ok:
+        return None
+    return buf.tobytes()
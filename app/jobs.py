@@ -0,0 +1,301 @@
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.face_recognition_dep import face_recognition_pipeline
+from utils.face_anti_spoofing_dep import anti_spoofing_video_pipeline, liveness_workers_for
+from utils.stage_timing import capture, count, observe, record_events, span
+from utils.model_registry import warm_up
+
+AUTH_JOB_MODE = True             # /api/authorize queues a job and returns 202 + job id
+AUTH_WORKERS = int(os.environ.get("AUTH_WORKERS", 2))          # authorization processes
+MAX_PENDING_JOBS = int(os.environ.get("AUTH_MAX_PENDING", 8))  # queued + running before 503
+JOB_TTL_SECONDS = 300            # finished results are kept this long for polling
+RETRY_AFTER_SECONDS = 5          # hint sent with the "queue full" response
+HOST_JOB_PROCESSES = None        # job processes on this host, all web workers together (None = AUTH_WORKERS);
+                                 # each gets an equal share of the cores for its liveness pool
+JOB_STATE_DIR = "data/auth-jobs" # job state every forked web worker can read (see app.server)
+USE_SHARED_JOB_STATE = True      # answer a poll in any worker, not only the one that queued the job
+
+
+def authorize_video(video_bytes):
+    """
+    Liveness check followed by recognition, without touching Flask.
+
+    Returns:
+        (payload, http_status): the JSON body /api/authorize sends. On success
+        the payload carries chef_id and chef_name; the web layer adds the
+        session and redirect.
+    """
+    with span("authorization.total"):
+        payload, http_status = _authorize(video_bytes)
+    count("authorizations_total", status=http_status)
+    return payload, http_status
+
+
+def _authorize(video_bytes):
+    # 1) Anti-spoofing
+    try:
+        status, best_frame, metrics, debug = anti_spoofing_video_pipeline(io.BytesIO(video_bytes))
+
+        if status is False:  # spoof
+            return {"ok": False, "message": "Spoof detected.", "debug": debug}, 403
+        if status == -1:  # not enough frames or error
+            return {"ok": False, "message": "Not enough frames for liveness.", "debug": debug}, 400
+    except Exception as e:
+        return {"ok": False, "message": f"Anti-spoofing failed: {e}"}, 500
+
+    # 2) Face recognition
+    try:
+        # Reuse the in-memory frame and face box found during liveness
+        recog = face_recognition_pipeline(best_frame["image"], face_location=best_frame["face_location"])
+        if recog == -1:
+            return {"ok": False, "message": "Failed to connect to database."}, 500
+        elif recog == -2:
+            return {"ok": False, "message": "Failed to load encodings."}, 500
+        elif recog == -3:
+            return {"ok": False, "message": "No face found in test image."}, 400
+        elif recog == -4:
+            return {"ok": False, "message": "No face matched."}, 401
+        else:
+            # Expected tuple: (chef_id, name)
+            chef_id, chef_name = recog
+            return {
+                "ok": True,
+                "message": f"Welcome {chef_name}!",
+                "chef_id": chef_id,
+                "chef_name": chef_name,
+            }, 200
+
+    except Exception as e:
+        return {"ok": False, "message": f"Recognition failed: {e}"}, 500
+
+
+def _run_job(video_bytes, pending_path=None):
+    """Pool task: authorize_video plus the timing events it recorded, for the web process to replay."""
+    if pending_path is not None:
+        _write_atomic(pending_path, "running")
+    with capture() as events:
+        payload, http_status = authorize_video(video_bytes)
+    return payload, http_status, events
+
+
+def _write_atomic(path, text):
+    # Write-then-rename, so a poll from another worker never reads a partial file
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _read_text(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _job_result(future):
+    try:
+        payload, http_status, _ = future.result()
+    except Exception as e:
+        # Worker crashed (e.g. killed by the OOM killer) or the result did not pickle
+        payload, http_status = {"ok": False, "message": f"Authorization job failed: {e}"}, 500
+    return payload, http_status
+
+
+def _init_worker(liveness_workers=1):
+    """Pool initializer: load the models and the gallery once per worker process."""
+    import utils.face_anti_spoofing_dep as asd
+
+    # Sized by the parent so that job processes x liveness workers fit the cores
+    asd.LIVENESS_WORKERS = liveness_workers
+
+    warm_up(label=f"Authorization worker {os.getpid()}")
+
+
+class AuthorizationJobs:
+    """
+    Bounded queue of authorization jobs run by a local process pool.
+
+    `submit` returns a job id immediately, or None when MAX_PENDING_JOBS are
+    already queued or running. `status` returns None for unknown ids,
+    {"state": "queued" | "running"} while the job runs, and then
+    {"state": "done", "payload", "http_status"}, the same result that
+    `authorize_video` returns. Stage timings recorded in the worker are
+    replayed into this process's registry when the job finishes.
+
+    With a `state_dir`, every job also has files there: <job_id>.pending
+    ("queued" or "running") until it finishes, then <job_id>.json with the
+    result. Forked web workers answer polls for each other's jobs from these
+    files, and MAX_PENDING_JOBS counts the jobs of every worker.
+    """
+
+    def __init__(self, workers=AUTH_WORKERS, max_pending=MAX_PENDING_JOBS, ttl=JOB_TTL_SECONDS, state_dir=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._jobs = {}
+
+    def _get_executor(self):
+        # Called with the lock held; a forked web worker starts its own pool
+        if self._pid != os.getpid():
+            self._executor = None
+            self._jobs = {}
+        if self._executor is None:
+            liveness_workers = liveness_workers_for(HOST_JOB_PROCESSES or self.workers)
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(liveness_workers,))
+            self._pid = os.getpid()
+        return self._executor
+
+    def _expire(self, now):
+        stale = [job_id for job_id, job in self._jobs.items()
+                 if job["finished"] is not None and now - job["finished"] > self.ttl]
+        for job_id in stale:
+            del self._jobs[job_id]
+        if self.state_dir is None:
+            return
+        # Also drops .pending files of a worker that died mid-job, so they stop counting
+        for filename in os.listdir(self.state_dir):
+            path = os.path.join(self.state_dir, filename)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass   # removed by another worker
+
+    def _state_path(self, job_id, suffix):
+        return os.path.join(self.state_dir, job_id + suffix)
+
+    def _pending_count(self):
+        # Called with the lock held
+        if self.state_dir is None:
+            return sum(1 for job in self._jobs.values() if job["finished"] is None)
+        return sum(1 for filename in os.listdir(self.state_dir) if filename.endswith(".pending"))
+
+    def pending(self):
+        with self._lock:
+            if self.state_dir is not None:
+                os.makedirs(self.state_dir, exist_ok=True)
+            return self._pending_count()
+
+    def submit(self, video_bytes):
+        with self._lock:
+            executor = self._get_executor()
+            if self.state_dir is not None:
+                os.makedirs(self.state_dir, exist_ok=True)
+            now = time.time()
+            self._expire(now)
+            if self._pending_count() >= self.max_pending:
+                return None
+
+            job_id = uuid.uuid4().hex
+            pending_path = None
+            if self.state_dir is not None:
+                pending_path = self._state_path(job_id, ".pending")
+                _write_atomic(pending_path, "queued")
+            try:
+                future = executor.submit(_run_job, video_bytes, pending_path)
+            except BrokenProcessPool:
+                # A worker died; replace the pool (jobs already failed report as such)
+                self._executor = None
+                executor = self._get_executor()
+                future = executor.submit(_run_job, video_bytes, pending_path)
+
+            job = {"future": future, "created": now, "finished": None}
+            self._jobs[job_id] = job
+
+        def on_done(done):
+            job["finished"] = time.time()
+            # Queue wait included: what the polling browser experiences
+            observe("authorization.job", job["finished"] - job["created"])
+            if done.cancelled():
+                if pending_path is not None and os.path.exists(pending_path):
+                    os.remove(pending_path)
+                return
+            if self.state_dir is not None:
+                self._publish_result(job_id, *_job_result(done))
+            if done.exception() is None:
+                record_events(done.result()[2])
+            else:
+                count("authorizations_total", status=500)   # worker crashed; status() reports a 500
+
+        job["future"].add_done_callback(on_done)
+        return job_id
+
+    def _publish_result(self, job_id, payload, http_status):
+        try:
+            _write_atomic(self._state_path(job_id, ".json"),
+                          json.dumps({"payload": payload, "http_status": http_status}))
+            os.remove(self._state_path(job_id, ".pending"))
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[Jobs] could not publish the result of job {job_id}: {e}")
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id) if self._pid == os.getpid() else None
+        if job is None:
+            return self._shared_status(job_id)
+
+        future = job["future"]
+        if not future.done():
+            return {"state": "running" if future.running() else "queued"}
+        payload, http_status = _job_result(future)
+        return {"state": "done", "payload": payload, "http_status": http_status}
+
+    def _shared_status(self, job_id):
+        # A job queued by another web worker
+        if self.state_dir is None:
+            return None
+        try:
+            job_id = uuid.UUID(hex=job_id).hex   # never build a path from an arbitrary string
+        except ValueError:
+            return None
+        done = self._read_result(job_id)
+        if done is not None:
+            return done
+        state = _read_text(self._state_path(job_id, ".pending"))
+        if state is None:
+            # Finished between the two reads, or unknown / expired
+            return self._read_result(job_id)
+        return {"state": state.strip() or "queued"}
+
+    def _read_result(self, job_id):
+        text = _read_text(self._state_path(job_id, ".json"))
+        if text is None:
+            return None
+        result = json.loads(text)
+        return {"state": "done", "payload": result["payload"], "http_status": result["http_status"]}
+
+    def shutdown(self, wait=False):
+        """Stop the pool; wait=True lets queued jobs finish (a recycled web worker)."""
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_jobs():
+    """Process-wide job queue, created on first use."""
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = AuthorizationJobs(state_dir=JOB_STATE_DIR if USE_SHARED_JOB_STATE else None)
+    return _jobs
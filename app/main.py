@@ -1,7 +1,8 @@
 import os
-import io
+import time
+_IMPORT_START = time.perf_counter()
 import numpy as np
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session
+from flask import Flask, Response, request, jsonify, render_template, redirect, url_for, flash, session
 from pathlib import Path
 import sys
 
@@ -9,18 +10,27 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from utils.face_detection_dep import face_detection_pipeline
 from utils.face_registration_dep import face_registration_pipeline
-from utils.face_recognition_dep import face_recognition_pipeline
-from utils.face_anti_spoofing_dep import anti_spoofing_video_pipeline
+from app.jobs import AUTH_JOB_MODE, RETRY_AFTER_SECONDS, authorize_video, get_jobs
+from utils.stage_timing import render_prometheus, set_gauge
+from utils.model_registry import warm_up
 from app.helpers import decode_base64_image, read_file_storage, extract_middle_frame_from_video_bytes
-from app.generate_ID import generate_new_chef_id
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_START   # models are not loaded yet; see warm_up()
 
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev-secret")  # needed for flash/session
 
 
-TEMP_IMAGE_DIR = os.path.join("data\images", "temporary-images")
+KNOWN_FACES_DIR = os.path.join("data", "images", "known_faces")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", 32))   # larger request bodies get 413
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_MB * 1024 * 1024
+
 
+@app.errorhandler(413)
+def upload_too_large(_error):
+    return jsonify({"ok": False, "message": f"Upload too large (limit {MAX_UPLOAD_MB} MB)."}), 413
 
 @app.route("/")
 def home():
@@ -49,7 +59,6 @@ def api_register():
     first_name = request.form.get("first_name", "").strip()
     last_name = request.form.get("last_name", "").strip()
     chef_name = (first_name + "-" + last_name).strip()
-    chef_id = generate_new_chef_id()
 
     image_file = request.files.get("image")
     image_data_url = request.form.get("image_data")
@@ -66,43 +75,35 @@ def api_register():
     if not img_bytes:
         return redirect(url_for('register_page', message="Please upload or capture an image."))
 
-    # Save image to disk temporarily
-    filename = f"{chef_id}_{chef_name}.jpg"
-    image_path = os.path.join(TEMP_IMAGE_DIR, filename)
+    # The upload stays in memory; only an accepted face is written to known_faces
+    # (as CHEFID_First-Last.jpg, with the ID allocated in the insert transaction)
     try:
-        with open(image_path, "wb") as f:
-            f.write(img_bytes)
-        
-        # Call deployment-ready pipeline
-        result = face_registration_pipeline(image_path=image_path)
+        result = face_registration_pipeline(image_bytes=img_bytes, name=chef_name, image_dir=KNOWN_FACES_DIR)
         if result == 1:
-            # Copy image to known_faces and delete temporary image
-            known_faces_dir = os.path.join("data", "images", "known_faces")
-            os.makedirs(known_faces_dir, exist_ok=True)
-            known_face_path = os.path.join(known_faces_dir, filename)
-            os.rename(image_path, known_face_path)
             # Success → redirect to dashboard
             session["chef_name"] = chef_name
             return redirect(url_for('dashboard'))
         elif result == -3:
-            os.remove(image_path)
             return redirect(url_for('register_page', message="Registration failed (DB or unknown error)"))
         elif result == -1:
-            os.remove(image_path)
             return redirect(url_for('register_page', message="No face found in image"))
         elif result == -2:
-            os.remove(image_path)
             return redirect(url_for('register_page', message="Encodings extraction failed"))
         elif result == -4:
-            os.remove(image_path)
             return redirect(url_for('register_page', message="Chef already exists.. Please authorize"))
         elif result == -5:
-            os.remove(image_path)
             return redirect(url_for('register_page', message="Failed to Add the chef. Internal Database error"))
 
     except Exception as e:
         return redirect(url_for('register_page', message=f"Registration failed: {e}"))
 
+def authorize_response(payload, http_status):
+    """JSON response for an authorization result; a match also signs the chef in."""
+    if payload.get("ok"):
+        session["chef_name"] = payload["chef_name"]
+        payload = dict(payload, redirect=url_for('dashboard'))
+    return jsonify(payload), http_status
+
 @app.route("/api/authorize", methods=["POST"])
 def api_authorize():
     video_file = request.files.get("video")
@@ -111,44 +112,37 @@ def api_authorize():
 
     video_bytes = read_file_storage(video_file)
 
-    # 1) Anti-spoofing
-    try:
-        status, best_frame_path, metrics, debug = anti_spoofing_video_pipeline(io.BytesIO(video_bytes))
-
-        if status is False:  # spoof
-            return jsonify({"ok": False, "message": "Spoof detected.", "debug": debug}), 403
-        if status == -1:  # not enough frames or error
-            return jsonify({"ok": False, "message": "Not enough frames for liveness.", "debug": debug}), 400
-    except Exception as e:
-        return jsonify({"ok": False, "message": f"Anti-spoofing failed: {e}"}), 500
-
-    # 3) Face recognition
-    try:
-        recog = face_recognition_pipeline(best_frame_path)
-        if recog == -1:
-            return jsonify({"ok": False, "message": "Failed to connect to database."}), 500
-        elif recog == -2:
-            return jsonify({"ok": False, "message": "Failed to load encodings."}), 500
-        elif recog == -3:
-            return jsonify({"ok": False, "message": "No face found in test image."}), 400
-        elif recog == -4:
-            return jsonify({"ok": False, "message": "No face matched."}), 401
-        else:
-            # Expected tuple: (chef_id, name)
-            chef_id, chef_name = recog
-            session["chef_name"] = chef_name
-            return jsonify({
-                "ok": True,
-                "message": f"Welcome {chef_name}!",
-                "chef_id": chef_id,
-                "chef_name": chef_name,
-                "redirect": url_for('dashboard')
-            })
-
-    except Exception as e:
-        return jsonify({"ok": False, "message": f"Recognition failed: {e}"}), 500
-    finally:
-        os.remove(best_frame_path)
+    if not AUTH_JOB_MODE:
+        return authorize_response(*authorize_video(video_bytes))
+
+    # Job mode: the pool runs liveness + recognition; the browser polls for the result
+    job_id = get_jobs().submit(video_bytes)
+    if job_id is None:
+        response = jsonify({"ok": False, "message": "Server busy, please try again shortly."})
+        response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+        return response, 503
+    return jsonify({
+        "ok": True,
+        "state": "queued",
+        "job_id": job_id,
+        "status_url": url_for('api_authorize_status', job_id=job_id),
+    }), 202
+
+@app.route("/api/authorize/jobs/<job_id>", methods=["GET"])
+def api_authorize_status(job_id):
+    status = get_jobs().status(job_id)
+    if status is None:
+        return jsonify({"ok": False, "message": "Unknown or expired job."}), 404
+    if status["state"] != "done":
+        return jsonify({"ok": True, "state": status["state"], "job_id": job_id}), 202
+    return authorize_response(status["payload"], status["http_status"])
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Stage latency histograms, frame counts and outcome counters (of every worker under app.server)
+    if AUTH_JOB_MODE:
+        set_gauge("authorization_jobs_pending", get_jobs().pending())
+    return Response(render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 
 if __name__ == "__main__":
@@ -156,4 +150,8 @@ if __name__ == "__main__":
     #   python -m app.main
     # Or directly:
     #   python app/main.py
+    print(f"⏱️  App imported in {IMPORT_SECONDS:.2f}s")
+    # The debug reloader serves from a child process; load the models there only
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up(label="App")
     app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Production entry point: preload once, then fork workers.
+
+The parent loads the dlib detector and shape predictor, the face_recognition
+models and the encoding gallery (utils.model_registry.warm_up). It binds the
+listening socket and forks WEB_WORKERS processes, which share those pages
+copy-on-write and accept connections from the same socket. Each worker serves
+one request at a time and exits after MAX_REQUESTS (plus some jitter). The
+parent then forks a fresh worker from its already warm state.
+
+Each worker runs the authorization jobs it queued in its own pool and
+publishes their state to app.jobs.JOB_STATE_DIR, so a poll can land on any
+worker. A recycled worker finishes its queued jobs before it exits. Workers
+write their metrics registries to stage_timing.METRICS_DIR, so /metrics
+reports the totals of every worker, including the ones already recycled.
+
+On platforms without fork (Windows) it falls back to one threaded process.
+
+Usage (from project root):
+    python -m app.server
+    python -m app.server --workers 8 --port 8000 --max-requests 500
+"""
+import argparse
+import gc
+import os
+import random
+import signal
+import socket
+import time
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app.jobs as jobs
+import app.main as web
+import utils.face_anti_spoofing_dep as asd
+from app.jobs import get_jobs
+from utils.database import close_connections
+from utils.model_registry import warm_up
+from utils.stage_timing import REGISTRY, flush_metrics, retire_metrics, share_metrics, start_metrics_flusher
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", 5000))
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", os.cpu_count() or 1))   # forked request processes
+MAX_REQUESTS = int(os.environ.get("MAX_REQUESTS", 1000))                # recycle a worker after this many (0 = never)
+MAX_REQUESTS_JITTER = 50         # random extra requests, so workers do not all restart together
+REQUEST_TIMEOUT_SECONDS = 60     # socket timeout; a stalled client cannot hold a worker forever
+LISTEN_BACKLOG = 128             # connections queued by the kernel while every worker is busy
+RESPAWN_DELAY_SECONDS = 1.0      # pause before replacing a worker that crashed (avoids a fork loop)
+
+
+class TimeoutRequestHandler(WSGIRequestHandler):
+    timeout = REQUEST_TIMEOUT_SECONDS
+
+
+def _worker(sock, host, port, max_requests):
+    """Forked child: serve requests from the shared socket, then exit to be replaced."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)      # the parent handles Ctrl-C and stops us
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    REGISTRY.reset()        # counts inherited from the parent are not this worker's
+    start_metrics_flusher()
+    server = make_server(host, port, web.app, request_handler=TimeoutRequestHandler, fd=sock.fileno())
+    limit = max_requests + random.randint(0, MAX_REQUESTS_JITTER) if max_requests else None
+    handled = 0
+    try:
+        while limit is None or handled < limit:
+            server.handle_request()
+            handled += 1
+        server.server_close()
+    finally:
+        if web.AUTH_JOB_MODE:
+            get_jobs().shutdown(wait=True)   # results land in the shared job dir for the poller
+        flush_metrics()     # the parent folds this file into the retired totals
+
+
+def serve_forked(host, port, workers, max_requests):
+    # Share the cores between the pools: whoever runs liveness gets cpu_count / (its siblings)
+    if web.AUTH_JOB_MODE:
+        jobs.HOST_JOB_PROCESSES = workers * jobs.AUTH_WORKERS
+    else:
+        asd.LIVENESS_WORKERS = asd.liveness_workers_for(workers)
+
+    warm_up(label="Server")
+    close_connections()   # SQLite handles must not cross fork; workers open their own
+    gc.freeze()   # keep the preloaded objects out of GC passes, so their pages stay shared
+    share_metrics(reset=True)
+
+    sock = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+    sock.set_inheritable(True)
+    print(f"🚀 Serving on http://{host}:{port} with {workers} workers (max_requests={max_requests or '∞'})")
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _worker(sock, host, port, max_requests)
+            except Exception as e:
+                print(f"[Worker {os.getpid()}] {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+    while children:
+        pid, status = os.wait()
+        children.discard(pid)
+        try:
+            retire_metrics(pid)
+        except OSError as e:
+            print(f"⚠️  Could not retire metrics of worker {pid}: {e}")
+        if stopping:
+            continue
+        if os.waitstatus_to_exitcode(status) != 0:
+            print(f"⚠️  Worker {pid} crashed (status {os.waitstatus_to_exitcode(status)}); replacing it")
+            time.sleep(RESPAWN_DELAY_SECONDS)
+        spawn()   # the replacement starts from the warm parent
+    sock.close()
+    print("👋 Server stopped")
+
+
+def serve_single(host, port):
+    """Fallback without fork: one threaded process."""
+    warm_up(label="Server")
+    print(f"🚀 Serving on http://{host}:{port} (single process)")
+    make_server(host, port, web.app, threaded=True, request_handler=TimeoutRequestHandler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS, help="recycle workers after this many requests (0 = never)")
+    args = parser.parse_args()
+
+    if hasattr(os, "fork"):
+        serve_forked(args.host, args.port, max(1, args.workers), args.max_requests)
+    else:
+        serve_single(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
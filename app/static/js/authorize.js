@@ -11,6 +11,33 @@ function setStatus(msg) {
   statusBox.textContent = msg || "";
 }
 
+const POLL_INTERVAL_MS = 1000;
+const POLL_TIMEOUT_MS = 120_000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Job mode: /api/authorize answers 202 with a status_url; poll it until the job is done
+async function waitForJob(res) {
+  let data = await res.json();
+  if (res.status !== 202) {
+    return data;
+  }
+  const statusUrl = data.status_url;
+  const deadline = Date.now() + POLL_TIMEOUT_MS;
+  while (res.status === 202) {
+    if (Date.now() > deadline) {
+      return { ok: false, message: "Authorization timed out." };
+    }
+    await sleep(POLL_INTERVAL_MS);
+    res = await fetch(statusUrl);
+    data = await res.json();
+    if (res.status === 202) {
+      setStatus(data.state === "running" ? "Checking liveness..." : "Waiting in queue...");
+    }
+  }
+  return data;
+}
+
 startBtn?.addEventListener("click", async () => {
   try {
     stream = await navigator.mediaDevices.getUserMedia({ video: true, audio: true });
@@ -52,7 +79,7 @@ recordBtn?.addEventListener("click", async () => {
         method: "POST",
         body: fd
       });
-      const data = await res.json();
+      const data = await waitForJob(res);
       if (data.ok) {
         setStatus("✅ " + (data.message || "Authorized."));
         const redirect = data.redirect || "/dashboard";
@@ -0,0 +1,99 @@
+"""
+Full-resolution vs downscaled HOG detection (and detect-every-frame vs
+keyframe tracking) in the liveness loop.
+
+Usage (from project root):
+    python dev/bench_face_detection.py                       # synthetic clip from a known face
+    python dev/bench_face_detection.py --video clip.webm     # real uploads
+    python dev/bench_face_detection.py --max-side 320
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import utils.face_anti_spoofing_dep as asd
+from dev.synthetic_video import DEFAULT_IMAGE, make_liveness_clip
+
+
+def time_detection(grays, max_side, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for gray in grays:
+            asd.detect_faces(gray, max_side)
+        best = min(best, time.perf_counter() - start)
+    return 1000.0 * best / len(grays)
+
+
+def run_liveness(frames, fps, max_side, mode="detect"):
+    asd.DETECTION_MAX_SIDE = max_side
+    asd.FACE_LOCALISATION_MODE = mode
+    start = time.perf_counter()
+    # Serial and without early exit: pool workers would keep the settings they were forked with,
+    # and every run must analyse the same frames
+    metrics = asd.analyze_frames_for_liveness(frames, stream_info={"effective_fps": fps},
+                                              early_exit=False, workers=1)
+    metrics["elapsed_ms"] = 1000.0 * (time.perf_counter() - start)
+    decision, _ = asd.decide_liveness(metrics)
+    return metrics, decision
+
+
+def compare(frames, fps, max_side, repeat):
+    grays = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in frames]
+    full_ms = time_detection(grays, None, repeat)
+    small_ms = time_detection(grays, max_side, repeat)
+
+    original = asd.DETECTION_MAX_SIDE, asd.FACE_LOCALISATION_MODE
+    try:
+        full, full_decision = run_liveness(frames, fps, None)
+        small, small_decision = run_liveness(frames, fps, max_side)
+        tracked, tracked_decision = run_liveness(frames, fps, max_side, mode="track")
+    finally:
+        asd.DETECTION_MAX_SIDE, asd.FACE_LOCALISATION_MODE = original
+
+    pairs = [(a, b) for a, b in zip(full["ear_series"], small["ear_series"]) if a is not None and b is not None]
+    ear_mae = float(np.mean([abs(a - b) for a, b in pairs])) if pairs else float("nan")
+    closed_agree = float(np.mean([(a < asd.EAR_THRESHOLD) == (b < asd.EAR_THRESHOLD) for a, b in pairs])) if pairs else float("nan")
+
+    print(f"  frame size           : {frames[0].shape[1]}x{frames[0].shape[0]}  ({len(frames)} frames)")
+    print(f"  detector ms/frame    : full={full_ms:.2f}  max_side={max_side}: {small_ms:.2f}  "
+          f"speedup x{full_ms / max(small_ms, 1e-9):.2f}")
+    print(f"  face frames          : {full['face_frames_count']} vs {small['face_frames_count']}")
+    print(f"  EAR mean |diff|      : {ear_mae:.4f}   closed-eye agreement: {closed_agree:.3f}")
+    print(f"  blinks               : {full['blink_count']} vs {small['blink_count']}")
+    print(f"  liveness decision    : {full_decision} vs {small_decision}")
+    print(f"  tracking mode        : detector calls {small['detector_calls']} -> {tracked['detector_calls']}, "
+          f"loop {small['elapsed_ms']:.0f}ms -> {tracked['elapsed_ms']:.0f}ms, "
+          f"blinks {tracked['blink_count']}, decision {tracked_decision}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", nargs="*", default=[], help="video files to benchmark")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="still used for the synthetic clip")
+    parser.add_argument("--max-side", type=int, default=asd.DETECTION_MAX_SIDE or 480)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.video:
+        for path in args.video:
+            with open(path, "rb") as f:
+                info = {}
+                frames = list(asd.video_bytes_to_frames(f.read(), stream_info=info))
+            print(path)
+            compare(frames, info.get("effective_fps"), args.max_side, args.repeat)
+    else:
+        fps = asd.CAPTURE_FPS
+        frames = make_liveness_clip(args.image, fps=fps)
+        print(f"synthetic clip from {args.image}")
+        compare(frames, fps, args.max_side, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Optical-flow modes ("full", "roi", "sparse"): cost per frame pair, avg_flow on
+live vs still clips, liveness decisions, and suggested per-mode thresholds.
+
+Thresholds are suggested by carrying OPTICAL_FLOW_THRESH over from "full":
+each mode's threshold is scaled by the ratio of its avg_flow to the "full"
+avg_flow on the live clips.
+
+Usage (from project root):
+    python dev/bench_optical_flow.py                         # synthetic live + still clips
+    python dev/bench_optical_flow.py --video live.webm --spoof-video photo.webm
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+import utils.face_anti_spoofing_dep as asd
+from dev.synthetic_video import DEFAULT_IMAGE, make_liveness_clip
+
+MODES = ("full", "roi", "sparse")
+
+
+def face_track(frames):
+    """Grayscale frames with the face box and landmarks of every frame that has a face."""
+    track = []
+    for frame in frames:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        dets = asd.detect_faces(gray)
+        if dets:
+            track.append((gray, dets[0], asd.landmarks(gray, dets[0])))
+    return track
+
+
+def time_flow(track, mode, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for (gray_prev, _, coords_prev), (gray, rect, _) in zip(track, track[1:]):
+            asd.flow_magnitude(gray_prev, gray, face_rect=rect, coords_prev=coords_prev, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return 1000.0 * best / max(1, len(track) - 1)
+
+
+def run_liveness(frames, fps, mode):
+    original = asd.FLOW_MODE
+    asd.FLOW_MODE = mode
+    try:
+        metrics = asd.analyze_frames_for_liveness(frames, stream_info={"effective_fps": fps},
+                                                  early_exit=False, workers=1)
+    finally:
+        asd.FLOW_MODE = original
+    decision, _ = asd.decide_liveness(metrics)
+    return metrics, decision
+
+
+def compare(clips, repeat):
+    """clips: list of (label, frames, fps, is_live)."""
+    results = {mode: {"ms": [], "live": [], "still": [], "decisions": []} for mode in MODES}
+    for label, frames, fps, is_live in clips:
+        track = face_track(frames)
+        print(f"{label}: {len(frames)} frames, {len(track)} with a face")
+        for mode in MODES:
+            ms = time_flow(track, mode, repeat)
+            metrics, decision = run_liveness(frames, fps, mode)
+            results[mode]["ms"].append(ms)
+            results[mode]["live" if is_live else "still"].append(metrics["avg_flow"])
+            results[mode]["decisions"].append((label, decision))
+            print(f"  {mode:6s}: {ms:7.2f} ms/pair  avg_flow={metrics['avg_flow']:.3f}  "
+                  f"threshold={asd.OPTICAL_FLOW_THRESHOLDS[mode]:.2f}  decision={decision}")
+
+    full_live = np.mean(results["full"]["live"]) if results["full"]["live"] else None
+    full_ms = np.mean(results["full"]["ms"])
+    print("\nsummary")
+    for mode in MODES:
+        r = results[mode]
+        live = np.mean(r["live"]) if r["live"] else float("nan")
+        still = np.mean(r["still"]) if r["still"] else float("nan")
+        suggested = asd.OPTICAL_FLOW_THRESH * live / full_live if full_live else float("nan")
+        agree = sum(d == dict(results["full"]["decisions"])[label] for label, d in r["decisions"])
+        print(f"  {mode:6s}: x{full_ms / max(np.mean(r['ms']), 1e-9):6.1f} faster  "
+              f"live avg_flow={live:.3f}  still avg_flow={still:.3f}  "
+              f"suggested threshold={suggested:.2f}  decisions agree with full: {agree}/{len(r['decisions'])}")
+
+
+def load_video(path):
+    with open(path, "rb") as f:
+        info = {}
+        frames = list(asd.video_bytes_to_frames(f.read(), stream_info=info))
+    return frames, info.get("effective_fps")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", nargs="*", default=[], help="live recordings")
+    parser.add_argument("--spoof-video", nargs="*", default=[], help="spoof recordings (photo / screen)")
+    parser.add_argument("--image", default=DEFAULT_IMAGE, help="still used for the synthetic clips")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    clips = []
+    for path in args.video:
+        clips.append((path, *load_video(path), True))
+    for path in args.spoof_video:
+        clips.append((path, *load_video(path), False))
+    if not clips:
+        fps = asd.CAPTURE_FPS
+        clips.append(("synthetic live", make_liveness_clip(args.image, fps=fps), fps, True))
+        clips.append(("synthetic still", make_liveness_clip(args.image, fps=fps, still=True), fps, False))
+    compare(clips, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
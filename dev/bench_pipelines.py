@@ -0,0 +1,285 @@
+"""
+Stage-level benchmarks for app startup and the liveness, detection,
+recognition and registration-ID paths, on synthetic inputs only.
+
+* Startup is a cold `import app.main` in a fresh interpreter plus the one-off
+  model warm-up (utils/model_registry.py).
+* Videos are generated from data/images/known_faces stills (pan/zoom + blinks).
+* Galleries are 1k / 10k / 100k random 128-d encodings plus the real encoding
+  of the query face, in a scratch database inside a temporary workspace, so
+  data/chefs.db is never touched.
+
+Results are written as JSON; compare a run against a baseline to catch
+regressions (a stage is flagged when its median grows by more than --tolerance).
+
+Usage (from project root):
+    python dev/bench_pipelines.py --out bench/baseline.json
+    python dev/bench_pipelines.py --out bench/new.json --baseline bench/baseline.json
+    python dev/bench_pipelines.py --diff bench/baseline.json bench/new.json
+    python dev/bench_pipelines.py --quick                    # 1k gallery, fewer repeats
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from glob import glob
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+import utils.face_anti_spoofing_dep as asd
+from utils import database, encoding_gallery
+from utils.encoding_codec import encode_encoding
+from utils.face_detection_dep import detect_and_encode, face_detection_pipeline
+from utils.face_recognition_dep import face_recognition_pipeline
+from utils.model_registry import warm_up
+from app.generate_ID import generate_new_chef_id
+from dev.synthetic_video import DEFAULT_IMAGE, encode_clip, make_liveness_clip
+
+KNOWN_FACES_GLOB = str(ROOT / "data" / "images" / "known_faces" / "*.jpg")
+GALLERY_SIZES = (1_000, 10_000, 100_000)
+DEFAULT_TOLERANCE = 1.20         # flag a stage whose median is >20% slower than the baseline
+IMPORT_APP_CODE = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def time_call(fn, repeat, warmup=1):
+    """Run `fn` warmup + repeat times; returns timing stats in ms and the last result."""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(1000.0 * (time.perf_counter() - start))
+    return summarize(samples), result
+
+
+def summarize(samples):
+    samples = np.array(samples)
+    return {
+        "repeat": len(samples),
+        "median_ms": float(np.median(samples)),
+        "mean_ms": float(samples.mean()),
+        "min_ms": float(samples.min()),
+        "p95_ms": float(np.percentile(samples, 95)),
+    }
+
+
+def bench_startup(repeat, results):
+    """Cold `import app.main` in fresh interpreters, then the one-off model warm-up in this process."""
+    samples = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_APP_CODE], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        samples.append(1000.0 * float(out.stdout.strip().splitlines()[-1]))
+    results["import_app_main"] = summarize(samples)
+
+    # The gallery is left out: it would open the real data/chefs.db
+    report = warm_up(gallery=False, label=None)
+    stats = summarize([1000.0 * report.pop("total")])
+    stats["steps_ms"] = {name: 1000.0 * seconds for name, seconds in report.items()}
+    results["warm_up"] = stats
+
+
+def build_gallery_db(size, query_encoding, seed=0):
+    """Fresh data/chefs.db (relative to the current workspace) with `size` random chefs + the query chef."""
+    database.close_connections()
+    shutil.rmtree("data", ignore_errors=True)
+    os.makedirs("data", exist_ok=True)
+    database.create_schema()
+
+    rng = np.random.default_rng(seed)
+    # Random unit-scale encodings sit ~1.4 apart, far outside the match tolerance
+    encodings = rng.normal(0.0, 0.09, size=(size, 128))
+    stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = [(database.format_chef_id(i + 1), f"Synthetic-{i + 1}", "synthetic.jpg", encode_encoding(enc), stamp)
+            for i, enc in enumerate(encodings)]
+    rows.append((database.format_chef_id(size + 1), "Query-Chef", "query.jpg", encode_encoding(query_encoding), stamp))
+    with database.transaction() as conn:
+        database.insert_chef_rows(conn, rows)
+    encoding_gallery.invalidate_gallery()
+
+
+def bench_liveness(image_path, fps, repeat, results):
+    frames = make_liveness_clip(image_path, fps=30)
+    video_bytes = encode_clip(frames, fps=30)
+    results["video_bytes_to_frames"], decoded = time_call(
+        lambda: list(asd.video_bytes_to_frames(video_bytes, target_fps=fps)), repeat)
+
+    stream_info = {"effective_fps": fps}
+    stats, metrics = time_call(
+        lambda: asd.analyze_frames_for_liveness(decoded, stream_info=dict(stream_info), workers=1), repeat)
+    stats["frames_used"] = metrics.get("frames_used")
+    results["analyze_frames_for_liveness"] = stats
+
+    if asd.LIVENESS_WORKERS > 1:
+        stats, _ = time_call(lambda: asd.analyze_frames_for_liveness(
+            decoded, stream_info=dict(stream_info), workers=asd.LIVENESS_WORKERS), repeat)
+        stats["workers"] = asd.LIVENESS_WORKERS
+        results["analyze_frames_for_liveness_parallel"] = stats
+
+    stats, _ = time_call(lambda: asd.analyze_frames_for_liveness(
+        decoded, stream_info=dict(stream_info), early_exit=False, workers=1), repeat)
+    results["analyze_frames_for_liveness_full_clip"] = stats
+
+    best = asd.pick_best_frame(metrics)
+    if best is None:
+        raise RuntimeError(f"No face found in the synthetic clip from {image_path}")
+    return best
+
+
+def bench_detection(image_paths, repeat, results):
+    stats, _ = time_call(lambda: [face_detection_pipeline(p) for p in image_paths], repeat)
+    for key in ("median_ms", "mean_ms", "min_ms", "p95_ms"):
+        stats[key] /= len(image_paths)   # per image
+    stats["images"] = len(image_paths)
+    results["face_detection_pipeline"] = stats
+
+
+def bench_gallery(size, best, query_encoding, repeat, results):
+    build_gallery_db(size, query_encoding)
+    gallery = encoding_gallery.get_gallery()
+
+    def cold_load():
+        encoding_gallery.invalidate_gallery()
+        gallery.ensure_loaded()
+    # The IVF index trains in the background after a load; keep it from competing with the timed loads
+    use_ann_index = encoding_gallery.USE_ANN_INDEX
+    encoding_gallery.USE_ANN_INDEX = False
+    try:
+        results[f"gallery_load[{size}]"], _ = time_call(cold_load, max(1, repeat // 2), warmup=0)
+    finally:
+        encoding_gallery.USE_ANN_INDEX = use_ann_index
+
+    # Match and recognition timings must all use the path the size selects (IVF from ANN_MIN_GALLERY_SIZE)
+    cold_load()
+    gallery.wait_for_index()
+
+    stats, match = time_call(lambda: gallery.match(query_encoding), repeat * 4)
+    stats["matched"] = bool(match["matched"])
+    results[f"gallery_match[{size}]"] = stats
+
+    stats, recog = time_call(
+        lambda: face_recognition_pipeline(best["image"], face_location=best["face_location"]), repeat)
+    stats["result"] = list(recog) if isinstance(recog, tuple) else recog
+    results[f"face_recognition_pipeline[{size}]"] = stats
+
+    results[f"generate_new_chef_id[{size}]"], _ = time_call(generate_new_chef_id, repeat * 4)
+
+
+def run(args):
+    image_paths = sorted(glob(KNOWN_FACES_GLOB))
+    if not image_paths:
+        raise FileNotFoundError(f"❌ No stills found at {KNOWN_FACES_GLOB}")
+    results = {}
+    print("⏱️  startup ...")
+    bench_startup(args.repeat, results)
+
+    query_image = str(ROOT / DEFAULT_IMAGE)
+    query = detect_and_encode(query_image)
+    if isinstance(query, int):
+        raise RuntimeError(f"❌ No face in {query_image}")
+
+    print("⏱️  liveness ...")
+    best = bench_liveness(query_image, asd.CAPTURE_FPS, args.repeat, results)
+    print("⏱️  detection ...")
+    bench_detection(image_paths[:args.images], args.repeat, results)
+
+    # Everything that uses relative data/ paths runs inside a scratch workspace
+    cwd = os.getcwd()
+    workspace = tempfile.mkdtemp(prefix="bench-pipelines-")
+    os.chdir(workspace)
+    try:
+        for size in args.sizes:
+            print(f"⏱️  gallery of {size} ...")
+            bench_gallery(size, best, query["encoding"], args.repeat, results)
+    finally:
+        database.close_connections()
+        encoding_gallery.invalidate_gallery()
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "capture_fps": asd.CAPTURE_FPS,
+            "flow_mode": asd.FLOW_MODE,
+            "face_localisation_mode": asd.FACE_LOCALISATION_MODE,
+            "gallery_sizes": list(args.sizes),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """Print median ratios per stage; returns the names of stages slower than `tolerance`."""
+    regressions = []
+    base, cur = baseline["results"], current["results"]
+    print(f"{'stage':48s} {'baseline':>10s} {'current':>10s} {'ratio':>7s}")
+    for name in sorted(set(base) | set(cur)):
+        if name not in base or name not in cur:
+            print(f"{name:48s} (only in {'current' if name in cur else 'baseline'})")
+            continue
+        b, c = base[name]["median_ms"], cur[name]["median_ms"]
+        ratio = c / b if b > 0 else float("inf")
+        flag = "❌" if ratio > tolerance else ("✅" if ratio < 1.0 / tolerance else "")
+        if ratio > tolerance:
+            regressions.append(name)
+        print(f"{name:48s} {b:10.2f} {c:10.2f} {ratio:7.2f} {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write the results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare this run against")
+    parser.add_argument("--diff", nargs=2, metavar=("BASELINE", "CURRENT"), help="compare two result files and exit")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="median ratio flagged as a regression")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(GALLERY_SIZES), help="gallery sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--images", type=int, default=10, help="known_faces stills timed for detection")
+    parser.add_argument("--quick", action="store_true", help="1k gallery and 2 repeats")
+    args = parser.parse_args()
+
+    if args.diff:
+        with open(args.diff[0]) as f:
+            baseline = json.load(f)
+        with open(args.diff[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if compare(baseline, current, args.tolerance) else 0)
+
+    if args.quick:
+        args.sizes, args.repeat = [GALLERY_SIZES[0]], 2
+
+    report = run(args)
+    print(json.dumps(report["results"], indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.exit(1 if compare(baseline, report, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
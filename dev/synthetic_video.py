@@ -0,0 +1,113 @@
+"""
+Synthetic liveness clips for offline benchmarking.
+
+A registered still (data/images/known_faces) is panned/zoomed slightly to
+produce head motion and optical flow, and the eye regions are squashed for a
+few frames to imitate blinks. Landmarks for the eye regions come from the same
+dlib models the liveness pipeline uses.
+"""
+import os
+import tempfile
+import cv2
+import numpy as np
+
+from utils.face_anti_spoofing_dep import RIGHT_EYE_IDX, LEFT_EYE_IDX
+from utils.model_registry import get_detector, get_shape_predictor
+
+DEFAULT_IMAGE = "data/images/known_faces/C0012_Rohit-Sharma.jpg"
+
+
+def _eye_boxes(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    dets = get_detector()(gray, 0)
+    if len(dets) == 0:
+        return []
+    shape = get_shape_predictor()(gray, dets[0])
+    coords = np.array([[pt.x, pt.y] for pt in shape.parts()])
+    boxes = []
+    for idx in (RIGHT_EYE_IDX, LEFT_EYE_IDX):
+        pts = coords[idx]
+        x0, y0 = pts.min(axis=0)
+        x1, y1 = pts.max(axis=0)
+        pad_x, pad_y = int(0.25 * (x1 - x0)), int(0.8 * (y1 - y0)) + 2
+        boxes.append((max(0, x0 - pad_x), max(0, y0 - pad_y), x1 + pad_x, y1 + pad_y))
+    return boxes
+
+
+def _close_eyes(image, boxes):
+    out = image.copy()
+    for x0, y0, x1, y1 in boxes:
+        patch = out[y0:y1, x0:x1]
+        if patch.size == 0:
+            continue
+        h, w = patch.shape[:2]
+        # Fill with the eyelid row just above the eye and keep a thin lash line
+        lid = np.repeat(out[max(0, y0 - 1):y0, x0:x1], h, axis=0) if y0 > 0 else patch
+        slit = cv2.resize(patch, (w, max(1, h // 6)), interpolation=cv2.INTER_AREA)
+        closed = lid.copy()
+        mid = h // 2
+        closed[mid:mid + slit.shape[0]] = slit
+        out[y0:y1, x0:x1] = closed
+    return out
+
+
+def make_liveness_clip(image_path=DEFAULT_IMAGE, seconds=10, fps=30,
+                       blink_times=(2.0, 5.5, 8.0), blink_duration=0.2,
+                       motion_px=6.0, max_side=720, still=False):
+    """
+    Build a list of BGR frames from a still image.
+
+    Args:
+        image_path (str): Source still.
+        seconds, fps: Clip length and frame rate.
+        blink_times (tuple): Seconds at which a blink starts.
+        blink_duration (float): Seconds the eyes stay closed.
+        motion_px (float): Amplitude of the pan in pixels.
+        max_side (int): Longest side of the output frames.
+        still (bool): Disable motion and blinks (a printed-photo style spoof).
+
+    Returns:
+        list[np.ndarray]: BGR frames.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        raise FileNotFoundError(f"Could not read {image_path}")
+    h, w = image.shape[:2]
+    scale = max_side / float(max(h, w))
+    image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    h, w = image.shape[:2]
+
+    eye_boxes = [] if still else _eye_boxes(image)
+    closed = _close_eyes(image, eye_boxes) if eye_boxes else image
+
+    frames = []
+    for i in range(int(seconds * fps)):
+        t = i / float(fps)
+        blinking = any(b <= t < b + blink_duration for b in blink_times) and not still
+        src = closed if blinking else image
+        if still:
+            frames.append(src.copy())
+            continue
+        dx = motion_px * np.sin(2 * np.pi * 0.4 * t)
+        dy = 0.5 * motion_px * np.sin(2 * np.pi * 0.25 * t)
+        zoom = 1.0 + 0.01 * np.sin(2 * np.pi * 0.2 * t)
+        m = cv2.getRotationMatrix2D((w / 2, h / 2), 0.0, zoom)
+        m[:, 2] += (dx, dy)
+        frames.append(cv2.warpAffine(src, m, (w, h), borderMode=cv2.BORDER_REPLICATE))
+    return frames
+
+
+def encode_clip(frames, fps=30):
+    """Encode frames to MJPG/AVI bytes, as an upload would arrive at /api/authorize."""
+    h, w = frames[0].shape[:2]
+    fd, path = tempfile.mkstemp(suffix=".avi")
+    os.close(fd)
+    try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+        for frame in frames:
+            writer.write(frame)
+        writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
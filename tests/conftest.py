@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Same as the dev/ scripts: make the project root importable however pytest is started
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from utils.database import close_connections, create_schema, insert_chef_rows, transaction
+from utils.encoding_codec import encode_encoding
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Empty chefs database with the app's schema."""
+    path = str(tmp_path / "chefs.db")
+    create_schema(path)
+    yield path
+    close_connections()
+
+
+def insert_encodings(db_path, encodings, first_number=1):
+    """Register one chef per encoding (C0001, C0002, ...); returns their chef ids."""
+    rows = [(f"C{first_number + i:04d}", f"Chef-{first_number + i}", "data/images/known_faces/x.jpg",
+             encode_encoding(encoding), "2024-01-01 00:00:00")
+            for i, encoding in enumerate(np.atleast_2d(encodings))]
+    with transaction(db_path) as conn:
+        insert_chef_rows(conn, rows)
+    return [row[0] for row in rows]
@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import insert_encodings
+from utils.database import allocate_chef_id, close_connections, transaction
+
+
+def test_ids_continue_after_the_highest_existing_id(db_path):
+    insert_encodings(db_path, np.zeros((3, 128)), first_number=10)   # C0010..C0012
+    with transaction(db_path) as conn:
+        assert allocate_chef_id(conn) == "C0013"
+        assert allocate_chef_id(conn) == "C0014"
+
+
+def test_rolled_back_id_is_handed_out_again(db_path):
+    with pytest.raises(RuntimeError):
+        with transaction(db_path) as conn:
+            assert allocate_chef_id(conn) == "C0001"
+            raise RuntimeError("registration failed")
+    with transaction(db_path) as conn:
+        assert allocate_chef_id(conn) == "C0001"
+
+
+def test_explicit_ids_move_the_counter_past_them(db_path):
+    with transaction(db_path) as conn:
+        allocate_chef_id(conn)
+    insert_encodings(db_path, np.zeros((1, 128)), first_number=50)
+    with transaction(db_path) as conn:
+        assert allocate_chef_id(conn) == "C0051"
+
+
+def test_concurrent_allocations_never_share_an_id(db_path):
+    # Every thread opens its own connection, so they contend through SQLite's write lock
+    threads, per_thread = 8, 25
+    allocated, errors = [], []
+    lock = threading.Lock()
+
+    def allocate():
+        try:
+            for _ in range(per_thread):
+                with transaction(db_path) as conn:
+                    chef_id = allocate_chef_id(conn)
+                with lock:
+                    allocated.append(chef_id)
+        except Exception as e:   # surfaced below; an exception in a thread would be lost
+            errors.append(e)
+        finally:
+            close_connections()
+
+    workers = [threading.Thread(target=allocate) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert errors == []
+    assert sorted(allocated) == [f"C{n:04d}" for n in range(1, threads * per_thread + 1)]
@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+import pytest
+
+from utils.encoding_codec import HEADER_SIZE, decode_encoding, encode_encoding, is_binary_encoding
+
+
+@pytest.fixture
+def encoding():
+    return np.random.default_rng(0).normal(0.0, 0.1, 128)
+
+
+def test_float64_round_trip_is_exact(encoding):
+    blob = encode_encoding(encoding)
+    assert is_binary_encoding(blob)
+    assert len(blob) == HEADER_SIZE + 128 * 8
+    decoded = decode_encoding(blob)
+    assert decoded.dtype == np.float64
+    assert np.array_equal(decoded, encoding)
+
+
+def test_float32_round_trip(encoding):
+    blob = encode_encoding(encoding, dtype=np.float32)
+    assert len(blob) == HEADER_SIZE + 128 * 4
+    assert np.allclose(decode_encoding(blob), encoding, atol=1e-7)
+
+
+def test_decode_accepts_memoryview(encoding):
+    assert np.array_equal(decode_encoding(memoryview(encode_encoding(encoding))), encoding)
+
+
+@pytest.mark.parametrize("to_text", [
+    lambda e: str(list(e)),                                   # legacy rows (np.float64(...) under numpy >= 2)
+    lambda e: str([float(x) for x in e]),
+    lambda e: json.dumps([float(x) for x in e]),
+])
+def test_legacy_text_rows_decode_to_the_same_values(encoding, to_text):
+    assert not is_binary_encoding(to_text(encoding))
+    assert np.array_equal(decode_encoding(to_text(encoding)), encoding)
+
+
+@pytest.mark.parametrize("value", [b"not an encoding", b"FENC\x09d\x00\x00", b"FENC\x01x\x00\x00", "junk", 42])
+def test_invalid_values_raise_value_error(value):
+    with pytest.raises(ValueError):
+        decode_encoding(value)
@@ -0,0 +1,129 @@
+import threading
+
+import numpy as np
+import pytest
+
+import utils.encoding_gallery as encoding_gallery
+from conftest import insert_encodings
+from utils.ann_index import IVFIndex, recall_check
+from utils.database import close_connections
+from utils.encoding_gallery import EncodingGallery
+from utils.face_matcher import top_k_matches
+
+N_CHEFS = 400
+
+
+@pytest.fixture
+def encodings():
+    return np.random.default_rng(0).normal(0.0, 0.1, size=(N_CHEFS, 128))
+
+
+@pytest.fixture
+def queries(encodings):
+    rng = np.random.default_rng(1)
+    enrolled = encodings[rng.choice(N_CHEFS, 30, replace=False)] + rng.normal(0.0, 0.02, size=(30, 128))
+    strangers = rng.normal(0.0, 0.1, size=(10, 128))
+    return np.vstack([enrolled, strangers])
+
+
+@pytest.fixture
+def small_ann(monkeypatch):
+    # Use the IVF index on test-sized galleries
+    monkeypatch.setattr(encoding_gallery, "ANN_MIN_GALLERY_SIZE", 100)
+
+
+def assert_same_as_brute_force(gallery, encodings, queries, identity=True):
+    for query in queries:
+        exact = top_k_matches(encodings, query)
+        result = gallery.match(query)
+        assert result["matched"] == exact["matched"]
+        if identity and exact["matched"]:
+            assert result["best_index"] == exact["best_index"]
+            assert result["ids"][0] == exact["best_index"] + 1   # rows were inserted in order
+            assert np.isclose(result["best_distance"], exact["best_distance"])
+
+
+def test_brute_force_match_equals_top_k(db_path, encodings, queries, monkeypatch):
+    monkeypatch.setattr(encoding_gallery, "USE_ANN_INDEX", False)
+    insert_encodings(db_path, encodings)
+    gallery = EncodingGallery(db_path)
+    assert len(gallery) == N_CHEFS
+    assert_same_as_brute_force(gallery, encodings, queries)
+    assert gallery.match(queries[0])["max_id"] == N_CHEFS
+
+
+def test_ivf_match_keeps_the_brute_force_decision(db_path, encodings, queries, small_ann):
+    insert_encodings(db_path, encodings)
+    gallery = EncodingGallery(db_path)
+    gallery.ensure_loaded()
+    gallery.wait_for_index()
+    assert gallery._index is not None
+    # Well separated synthetic chefs, so the identity must agree as well
+    assert_same_as_brute_force(gallery, encodings, queries)
+
+
+def test_recall_check_reports_identity_agreement(encodings, queries):
+    report = recall_check(encodings, queries, index=IVFIndex().build(encodings))
+    assert report["decision_agreement"] == 1.0
+    assert report["identity_agreement"] == 1.0
+
+
+def test_ivf_extend_indexes_new_rows(encodings):
+    index = IVFIndex().build(encodings[:300])
+    index.extend(encodings[300:], 300)
+    assert index.size == N_CHEFS
+    assert sorted(np.concatenate(index.lists).tolist()) == list(range(N_CHEFS))
+    assert 350 in index.candidates(encodings[350], n_probe=1)
+
+
+def test_snapshot_append_is_seen_by_other_workers(db_path, encodings, tmp_path, small_ann):
+    snapshot_dir = str(tmp_path / "snapshot")
+    insert_encodings(db_path, encodings[:300])
+    writer = EncodingGallery(db_path, snapshot_dir=snapshot_dir)
+    reader = EncodingGallery(db_path, snapshot_dir=snapshot_dir)
+    reader.ensure_loaded()
+    reader.wait_for_index()
+    index, version = reader._index, reader._version
+    assert isinstance(reader.encodings, np.memmap)
+
+    # Another worker registers chefs and publishes a new version
+    insert_encodings(db_path, encodings[300:], first_number=301)
+    writer.refresh()
+
+    result = reader.match(encodings[350])
+    assert reader._version != version
+    assert len(reader.ids) == N_CHEFS
+    assert result["matched"] and result["ids"][0] == 351
+    # Appended rows extend the trained index instead of dropping it
+    assert reader._index is index and index.size == N_CHEFS
+    assert_same_as_brute_force(reader, encodings, encodings[::40])
+
+
+def test_snapshot_not_matching_the_table_is_rebuilt(db_path, encodings, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    insert_encodings(db_path, encodings[:10])
+    EncodingGallery(db_path, snapshot_dir=snapshot_dir).ensure_loaded()
+    insert_encodings(db_path, encodings[10:20], first_number=11)   # written without publishing
+
+    gallery = EncodingGallery(db_path, snapshot_dir=snapshot_dir)
+    assert len(gallery) == 20
+
+
+def test_private_gallery_sees_rows_committed_elsewhere(db_path, encodings, monkeypatch):
+    monkeypatch.setattr(encoding_gallery, "USE_ANN_INDEX", False)
+    insert_encodings(db_path, encodings[:10])
+    gallery = EncodingGallery(db_path)
+    assert len(gallery) == 10
+
+    def register_elsewhere():
+        # Its own connection, standing in for the web process of a job worker
+        insert_encodings(db_path, encodings[10:11], first_number=11)
+        close_connections()
+
+    thread = threading.Thread(target=register_elsewhere)
+    thread.start()
+    thread.join()
+
+    result = gallery.match(encodings[10])
+    assert result["matched"] and result["ids"][0] == 11
+    assert len(gallery) == 11
@@ -0,0 +1,129 @@
+import multiprocessing
+import os
+import types
+
+import numpy as np
+import pytest
+
+import utils.face_anti_spoofing_dep as asd
+import utils.model_registry as model_registry
+
+N_FRAMES = 150
+NO_FACE_FRAMES = set(range(40, 45)) | {16, 17, 31, 32}
+IGNORED_METRICS = ("best_frame", "stage_seconds", "detector_calls")   # timings; track-mode detections per chunk
+
+
+class Rect:
+    """Minimal stand-in for dlib.rectangle."""
+    def __init__(self, left, top, right, bottom):
+        self._box = (left, top, right, bottom)
+
+    def left(self):
+        return self._box[0]
+
+    def top(self):
+        return self._box[1]
+
+    def right(self):
+        return self._box[2]
+
+    def bottom(self):
+        return self._box[3]
+
+
+def scripted_landmarks():
+    # Jittering face that pans sideways and blinks three times every 37 frames
+    rng = np.random.default_rng(0)
+    base = rng.uniform(100, 300, size=(68, 2))
+    series = []
+    for i in range(N_FRAMES):
+        pan = [3 * np.sin(i / 5), 0]
+        coords = base + rng.normal(0, 0.3, size=(68, 2)) + pan
+        half_height = 1 if i % 37 in (10, 11, 12) else 5
+        for x0, start in ((120, 36), (180, 42)):
+            eye = [(x0, 150), (x0 + 10, 150 - half_height), (x0 + 20, 150 - half_height),
+                   (x0 + 30, 150), (x0 + 20, 150 + half_height), (x0 + 10, 150 + half_height)]
+            coords[start:start + 6] = np.array(eye) + rng.normal(0, 0.3, size=(6, 2)) + pan
+        series.append(coords)
+    return series
+
+
+def frame_index(gray):
+    # Frames carry their index in the first two pixels
+    return int(gray[0, 0]) + 256 * int(gray[0, 1])
+
+
+def scripted_frames():
+    texture = np.random.default_rng(1).integers(0, 255, size=(120, 160), dtype=np.uint8)
+    frames = []
+    for i in range(N_FRAMES):
+        gray = np.roll(texture, i % 7, axis=1)
+        gray[0, 0], gray[0, 1] = i % 256, i // 256
+        frames.append(np.dstack([gray, gray, gray]))
+    return frames
+
+
+def run(frames, **kwargs):
+    metrics = asd.analyze_frames_for_liveness(iter(frames), stream_info={"effective_fps": 30}, **kwargs)
+    for key in IGNORED_METRICS:
+        metrics.pop(key)
+    return metrics
+
+
+def assert_same_metrics(serial, parallel):
+    assert serial.keys() == parallel.keys()
+    for key in serial:
+        np.testing.assert_equal(parallel[key], serial[key], err_msg=key)
+
+
+@pytest.fixture
+def fresh_pool():
+    # The pool's worker processes keep whatever models they were forked with
+    yield
+    if asd._liveness_pool is not None:
+        asd._liveness_pool.shutdown(cancel_futures=True)
+    asd._liveness_pool = asd._liveness_pool_key = None
+
+
+@pytest.fixture
+def scripted_models(monkeypatch, fresh_pool):
+    """
+    Deterministic detector and landmark predictor keyed on the frame index, so
+    the test covers the chunking and merging rather than dlib itself.
+    """
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("scripted models only reach forked pool workers")
+    series = scripted_landmarks()
+    monkeypatch.setattr(model_registry, "_models", {
+        "dlib": types.SimpleNamespace(rectangle=Rect),
+        "detector": lambda gray, upsample: [] if frame_index(gray) in NO_FACE_FRAMES else [Rect(0, 0, 10, 10)],
+        "shape_predictor": lambda gray, rect: types.SimpleNamespace(
+            parts=lambda: [types.SimpleNamespace(x=int(x), y=int(y)) for x, y in series[frame_index(gray)]]),
+    })
+    monkeypatch.setattr(asd, "FACE_LOCALISATION_MODE", "detect")
+
+
+@pytest.mark.parametrize("early_exit", [False, True])
+@pytest.mark.parametrize("flow_mode", ["full", "roi", "sparse"])
+def test_parallel_merge_matches_serial_loop(scripted_models, monkeypatch, early_exit, flow_mode):
+    monkeypatch.setattr(asd, "FLOW_MODE", flow_mode)
+    frames = scripted_frames()
+    serial = run(frames, workers=1, early_exit=early_exit)
+    parallel = run(frames, workers=3, early_exit=early_exit)
+
+    assert serial["blink_count"] >= 1
+    assert serial["early_exit"] == early_exit
+    assert_same_metrics(serial, parallel)
+
+
+@pytest.mark.parametrize("early_exit", [False, True])
+def test_parallel_matches_serial_on_a_synthetic_clip(monkeypatch, fresh_pool, early_exit):
+    pytest.importorskip("dlib")
+    if not os.path.exists(model_registry.SHAPE_PREDICTOR_PATH):
+        pytest.skip(f"{model_registry.SHAPE_PREDICTOR_PATH} not downloaded")
+    from dev.synthetic_video import make_liveness_clip
+
+    monkeypatch.setattr(asd, "FACE_LOCALISATION_MODE", "detect")
+    frames = make_liveness_clip(seconds=6, fps=15)
+    assert_same_metrics(run(frames, workers=1, early_exit=early_exit),
+                        run(frames, workers=2, early_exit=early_exit))
@@ -0,0 +1,204 @@
+import time
+import numpy as np
+from utils.face_matcher import MATCH_TOLERANCE, squared_distances, squared_norms, top_k_matches, rerank_candidates
+
+## IVF settings ##
+ANN_MIN_GALLERY_SIZE = 5000      # below this a brute-force scan is already cheap
+ANN_N_PROBE = 8                  # inverted lists scanned per query
+KMEANS_ITERATIONS = 20           # Lloyd iterations when training the coarse quantizer
+KMEANS_BATCH = 8192              # rows per assignment batch (bounds the N x L distance block)
+REBUILD_GROWTH = 2.0             # retrain once the index has grown by this factor
+
+
+def kmeans(data, n_clusters, n_iter=KMEANS_ITERATIONS, seed=0):
+    """
+    Plain Lloyd k-means in NumPy.
+
+    Returns:
+        (centroids, assignments): (n_clusters, D) float64 and (N,) int64.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, min(n_clusters, len(data)))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)].copy()
+    data_sq = squared_norms(data)
+
+    assignments = np.zeros(len(data), dtype=np.int64)
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(data, centroids, data_sq)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Re-seed empty lists from random points so no partition is wasted
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids, assign_to_centroids(data, centroids, data_sq)
+
+
+def assign_to_centroids(data, centroids, data_sq=None):
+    """Index of the nearest centroid for every row, computed in bounded batches."""
+    data = np.asarray(data, dtype=np.float64).reshape(-1, centroids.shape[1])
+    if data_sq is None:
+        data_sq = squared_norms(data)
+    centroid_sq = squared_norms(centroids)
+    out = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), KMEANS_BATCH):
+        block = data[start:start + KMEANS_BATCH]
+        d2 = data_sq[start:start + KMEANS_BATCH, None] - 2.0 * (block @ centroids.T) + centroid_sq[None, :]
+        out[start:start + KMEANS_BATCH] = np.argmin(d2, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted-file index over gallery rows.
+
+    Encodings are partitioned by k-means; a query scans only the `n_probe`
+    lists whose centroids are closest and the candidates are re-ranked exactly.
+    The index stores row numbers into the gallery matrix, not the vectors.
+    """
+
+    def __init__(self, n_lists=None, n_probe=ANN_N_PROBE, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.centroids = None
+        self.lists = []
+        self.size = 0
+        self.trained_size = 0
+
+    def build(self, encodings):
+        """Train the coarse quantizer on `encodings` and index every row."""
+        encodings = np.asarray(encodings, dtype=np.float64)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(encodings))))
+        self.centroids, assignments = kmeans(encodings, n_lists, seed=self.seed)
+
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(len(self.centroids))]
+        self.size = self.trained_size = len(encodings)
+        return self
+
+    def add(self, encoding, row_index):
+        """Index one new gallery row without retraining."""
+        self.extend(encoding, row_index)
+
+    def extend(self, encodings, start_row):
+        """Index consecutive new gallery rows, the first at `start_row`, without retraining."""
+        encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, self.centroids.shape[1])
+        if len(encodings) == 0:
+            return
+        assignments = assign_to_centroids(encodings, self.centroids)
+        rows = np.arange(start_row, start_row + len(encodings), dtype=np.int64)
+        for list_id in np.unique(assignments):
+            self.lists[list_id] = np.concatenate([self.lists[list_id], rows[assignments == list_id]])
+        self.size += len(encodings)
+
+    @property
+    def needs_rebuild(self):
+        return self.size >= REBUILD_GROWTH * max(1, self.trained_size)
+
+    def candidates(self, query, n_probe=None):
+        """Gallery row numbers stored in the `n_probe` lists nearest to `query`."""
+        n_probe = max(1, min(n_probe or self.n_probe, len(self.centroids)))
+        d2 = squared_distances(self.centroids, query)
+        probes = np.argpartition(d2, n_probe - 1)[:n_probe]
+        return np.concatenate([self.lists[i] for i in probes])
+
+
+def ann_top_k_matches(index, encodings, query, k=2, tolerance=MATCH_TOLERANCE,
+                      sq_norms=None, n_probe=None):
+    """
+    top_k_matches restricted to the probed IVF lists.
+
+    If no probed candidate falls within `tolerance`, the query falls back to
+    the exact brute-force scan, so the boolean accept/reject decision is
+    always the same as the brute-force path. The matched identity is not
+    guaranteed: when the true nearest row sits in a list that was not probed
+    and a different row in a probed list is also within `tolerance`, that
+    row is returned (`approximate` is True). recall_check reports how often
+    the top-1 identity agrees with brute force; raise `n_probe` (or disable
+    the index) if that is not close enough to 1.
+    """
+    candidates = index.candidates(query, n_probe)
+    # Rows appended to the index after `encodings` was snapshotted are skipped
+    candidates = candidates[candidates < len(encodings)]
+    if len(candidates) > 0:
+        cand_norms = None if sq_norms is None else sq_norms[candidates]
+        d2 = squared_distances(encodings[candidates], query, cand_norms)
+        kk = min(k, len(candidates))
+        top = candidates[np.argpartition(d2, kk - 1)[:kk]]
+        result = rerank_candidates(encodings, query, top, k=k, tolerance=tolerance)
+        if result["matched"]:
+            result["approximate"] = True
+            return result
+
+    result = top_k_matches(encodings, query, k=k, tolerance=tolerance, sq_norms=sq_norms)
+    result["approximate"] = False
+    return result
+
+
+def recall_check(encodings, queries, k=1, n_probe=ANN_N_PROBE, index=None, tolerance=MATCH_TOLERANCE):
+    """
+    Compare IVF search with the brute-force path.
+
+    Returns:
+        dict: recall@k of the probed candidates (before fallback), agreement of
+              the final match decision, agreement of the returned top-1 row
+              among queries brute force accepts (the identity that would sign
+              in) and mean latency of both paths.
+    """
+    encodings = np.asarray(encodings, dtype=np.float64)
+    sq = squared_norms(encodings)
+    if index is None:
+        index = IVFIndex(n_probe=n_probe).build(encodings)
+
+    hits = 0
+    decisions_equal = 0
+    accepted = identities_equal = 0
+    exact_time = ann_time = 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        exact = top_k_matches(encodings, q, k=k, tolerance=tolerance, sq_norms=sq)
+        t1 = time.perf_counter()
+        approx = ann_top_k_matches(index, encodings, q, k=k, tolerance=tolerance, sq_norms=sq, n_probe=n_probe)
+        t2 = time.perf_counter()
+        exact_time += t1 - t0
+        ann_time += t2 - t1
+
+        probed = set(index.candidates(q, n_probe).tolist())
+        hits += len(probed.intersection(exact["indices"].tolist())) / len(exact["indices"])
+        decisions_equal += exact["matched"] == approx["matched"]
+        if exact["matched"]:
+            accepted += 1
+            identities_equal += approx["matched"] and approx["best_index"] == exact["best_index"]
+
+    n = max(1, len(queries))
+    return {
+        "recall_at_k": hits / n,
+        "decision_agreement": decisions_equal / n,
+        "identity_agreement": identities_equal / accepted if accepted else 1.0,
+        "exact_ms": 1000 * exact_time / n,
+        "ann_ms": 1000 * ann_time / n,
+    }
+
+
+if __name__ == "__main__":
+    # Recall check on a synthetic gallery: python -m utils.ann_index
+    rng = np.random.default_rng(0)
+    n_chefs = 20000
+    gallery = rng.normal(0.0, 0.1, size=(n_chefs, 128))
+    enrolled = gallery[rng.choice(n_chefs, 200, replace=False)] + rng.normal(0.0, 0.02, size=(200, 128))
+    strangers = rng.normal(0.0, 0.1, size=(50, 128))
+
+    index = IVFIndex().build(gallery)
+    for n_probe in (1, 4, ANN_N_PROBE, 16):
+        known = recall_check(gallery, enrolled, k=1, n_probe=n_probe, index=index)
+        unknown = recall_check(gallery, strangers, k=1, n_probe=n_probe, index=index)
+        print(f"n_probe={n_probe:>2}  recall@1={known['recall_at_k']:.3f}  "
+              f"decision agreement={known['decision_agreement']:.3f}/{unknown['decision_agreement']:.3f}  "
+              f"identity agreement={known['identity_agreement']:.3f}  "
+              f"exact={known['exact_ms']:.2f}ms  ivf={known['ann_ms']:.2f}ms")
@@ -0,0 +1,220 @@
+import argparse
+import os
+import shutil
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from glob import glob
+import numpy as np
+
+from utils.face_detection_dep import detect_and_encode
+from utils.face_registration_dep import KNOWN_FACES_DIR, extract_info_from_filename
+from utils.encoding_codec import decode_encoding, encode_encoding
+from utils.encoding_gallery import get_gallery
+from utils.face_matcher import MATCH_TOLERANCE, nearest_neighbours
+from utils.database import DB_PATH, fetch_chef_ids_and_names, fetch_encoding_rows, insert_chef_rows, transaction
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def _encode_file(image_path):
+    # Runs in a worker process; dict results (with the encoding array) pickle back
+    return image_path, detect_and_encode(image_path)
+
+
+def list_images(folder):
+    files = []
+    for ext in IMAGE_EXTENSIONS:
+        files.extend(glob(os.path.join(folder, f"*{ext}")))
+    return sorted(set(files))
+
+
+def bulk_import(folder, workers=None, db_path=DB_PATH, tolerance=MATCH_TOLERANCE, dry_run=False,
+                image_dir=KNOWN_FACES_DIR):
+    """
+    Register every CHEFID_First-Last image in `folder` in one go.
+
+    Encodings are computed in a process pool. Duplicate checks (chef id, name
+    and face distance) run in batch against the gallery and within the batch.
+    All accepted rows are inserted with executemany in a single transaction,
+    which first repeats the table checks for rows committed in the meantime.
+    Accepted images are copied to `image_dir` as CHEFID_<name><ext>, the same
+    layout registration writes.
+
+    Returns:
+        list[dict]: One report entry per file (path, chef_id, name, status, detail).
+    """
+    files = list_images(folder)
+    report = {path: {"path": path, "chef_id": None, "name": None, "status": None, "detail": ""}
+              for path in files}
+    if not files:
+        return []
+
+    # 1) Filenames -> metadata
+    candidates = []
+    for path in files:
+        chef_id, name = extract_info_from_filename(os.path.basename(path))
+        report[path].update(chef_id=chef_id, name=name)
+        if chef_id == "Unknown":
+            report[path].update(status="bad_filename", detail="expected CHEFID_First-Last")
+        else:
+            candidates.append(path)
+
+    # 2) Encodings in parallel
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        encoded = dict(pool.map(_encode_file, candidates, chunksize=4))
+
+    # 3) Duplicate checks against the table
+    existing = fetch_chef_ids_and_names(db_path)
+    existing_ids = {row[0] for row in existing}
+    existing_names = {row[1] for row in existing}
+
+    accepted = []
+    for path in candidates:
+        entry, result = report[path], encoded[path]
+        if result == -1:
+            entry.update(status="no_face")
+        elif result == -2:
+            entry.update(status="encoding_failed")
+        elif entry["chef_id"] in existing_ids:
+            entry.update(status="duplicate_id")
+        elif entry["name"] in existing_names:
+            entry.update(status="duplicate_name")
+        else:
+            accepted.append(path)
+
+    queries = np.array([encoded[p]["encoding"] for p in accepted]).reshape(-1, 128)
+
+    # 3a) faces already in the gallery, one batched distance pass
+    gallery = get_gallery(db_path)
+    gallery.ensure_loaded()
+    gallery_max_id = int(gallery.ids.max()) if len(gallery.ids) else 0
+    indices, distances = nearest_neighbours(gallery.encodings, queries, gallery.sq_norms)
+    for i, path in enumerate(accepted):
+        if distances[i] <= tolerance:
+            report[path].update(status="duplicate_face",
+                                detail=f"matches {gallery.names[indices[i]]} (d={distances[i]:.3f})")
+
+    # 3b) duplicates inside the batch: the first file of a group wins
+    rows = []
+    kept, kept_enc, seen_ids, seen_names = [], [], set(), set()
+    for i, path in enumerate(accepted):
+        entry = report[path]
+        if entry["status"] is not None:
+            continue
+        if entry["chef_id"] in seen_ids:
+            entry.update(status="duplicate_id", detail="repeated in batch")
+            continue
+        if entry["name"] in seen_names:
+            entry.update(status="duplicate_name", detail="repeated in batch")
+            continue
+        if kept_enc:
+            j, d = nearest_neighbours(np.array(kept_enc), queries[i:i + 1])
+            if d[0] <= tolerance:
+                entry.update(status="duplicate_face",
+                             detail=f"matches {os.path.basename(kept[j[0]])} in batch (d={d[0]:.3f})")
+                continue
+
+        kept.append(path)
+        kept_enc.append(queries[i])
+        seen_ids.add(entry["chef_id"])
+        seen_names.add(entry["name"])
+        target = os.path.join(image_dir, f"{entry['chef_id']}_{entry['name']}{os.path.splitext(path)[1].lower()}")
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows.append((entry["chef_id"], entry["name"], target, encode_encoding(queries[i]), timestamp))
+
+    if dry_run:
+        for path in kept:
+            report[path].update(status="would_register")
+        return [report[path] for path in files]
+
+    # 4) One transaction for the whole batch
+    copied = []
+    try:
+        with transaction(db_path) as conn:
+            rows = _recheck_in_transaction(kept, rows, report, db_path, gallery_max_id, tolerance)
+            for path, row in zip(kept, rows):
+                if row is None:
+                    continue
+                try:
+                    os.makedirs(image_dir, exist_ok=True)
+                    shutil.copyfile(path, row[2])
+                except OSError as e:
+                    report[path].update(status="copy_failed", detail=str(e))
+                    continue
+                copied.append((path, row))
+            insert_chef_rows(conn, [row for _, row in copied])
+    except sqlite3.Error as e:
+        # Nothing was inserted; leave no orphaned images behind
+        for _, row in copied:
+            if os.path.exists(row[2]):
+                os.remove(row[2])
+        for path, _ in copied:
+            report[path].update(status="db_error", detail=str(e))
+        for path in kept:
+            if report[path]["status"] is None:
+                report[path].update(status="db_error", detail=str(e))
+        return [report[path] for path in files]
+
+    if copied:
+        gallery.refresh()
+    for path, _ in copied:
+        report[path].update(status="registered")
+    return [report[path] for path in files]
+
+
+def _recheck_in_transaction(kept, rows, report, db_path, gallery_max_id, tolerance):
+    """
+    Repeat the table checks under the write lock, against rows committed since
+    the first pass (e.g. a registration from the web app). Returns `rows` with
+    None in place of every row that is now a duplicate.
+    """
+    # The thread's connection is the one holding the transaction
+    existing = fetch_chef_ids_and_names(db_path)
+    existing_ids = {row[0] for row in existing}
+    existing_names = {row[1] for row in existing}
+    newer = []
+    for _, name, blob in fetch_encoding_rows(after_id=gallery_max_id, db_path=db_path):
+        try:
+            newer.append((name, decode_encoding(blob)))
+        except Exception as e:
+            print(f"Failed to load encoding for {name}: {e}")
+
+    checked = []
+    for path, row in zip(kept, rows):
+        entry = report[path]
+        if row[0] in existing_ids:
+            entry.update(status="duplicate_id", detail="registered while importing")
+            row = None
+        elif row[1] in existing_names:
+            entry.update(status="duplicate_name", detail="registered while importing")
+            row = None
+        elif newer:
+            j, d = nearest_neighbours(np.array([enc for _, enc in newer]), decode_encoding(row[3]).reshape(1, -1))
+            if d[0] <= tolerance:
+                entry.update(status="duplicate_face",
+                             detail=f"matches {newer[j[0]][0]}, registered while importing (d={d[0]:.3f})")
+                row = None
+        checked.append(row)
+    return checked
+
+
+if __name__ == "__main__":
+    # Run from project root:
+    #   python -m utils.bulk_import path/to/new_kitchen [--workers 8] [--dry-run]
+    parser = argparse.ArgumentParser(description="Register every CHEFID_First-Last.jpg in a folder.")
+    parser.add_argument("folder", help="folder laid out like data/images/known_faces")
+    parser.add_argument("--workers", type=int, default=None, help="encoding processes (default: CPU count)")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    parser.add_argument("--image-dir", default=KNOWN_FACES_DIR, help="where accepted images are copied")
+    parser.add_argument("--dry-run", action="store_true", help="run all checks without inserting")
+    args = parser.parse_args()
+
+    results = bulk_import(args.folder, workers=args.workers, db_path=args.db, dry_run=args.dry_run,
+                          image_dir=args.image_dir)
+    icons = {"registered": "✅", "would_register": "✅"}
+    for entry in results:
+        icon = icons.get(entry["status"], "❌")
+        detail = f" - {entry['detail']}" if entry["detail"] else ""
+        print(f"{icon} {os.path.basename(entry['path'])}: {entry['status']}{detail}")
+    ok = sum(entry["status"] in icons for entry in results)
+    print(f"{ok}/{len(results)} files {'would be ' if args.dry_run else ''}registered.")
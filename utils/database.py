@@ -0,0 +1,193 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DB_PATH = "data/chefs.db"
+BUSY_TIMEOUT_MS = 5000           # writers wait this long for the lock instead of failing
+SYNCHRONOUS = "NORMAL"           # durable with WAL; FULL would fsync the log on every commit
+CACHED_STATEMENTS = 64           # prepared statements kept per connection
+
+# Every statement the app runs against chefs.db lives here
+CREATE_REGISTERED_CHEFS = """
+    CREATE TABLE IF NOT EXISTS registered_chefs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chef_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        image_path TEXT NOT NULL,
+        encoding BLOB NOT NULL,
+        timestamp TEXT NOT NULL
+    )
+"""
+CREATE_NAME_INDEX = "CREATE INDEX IF NOT EXISTS idx_registered_chefs_name ON registered_chefs (name)"
+CREATE_ID_SEQUENCE = """
+    CREATE TABLE IF NOT EXISTS chef_id_sequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_value INTEGER NOT NULL
+    )
+"""
+SEED_ID_SEQUENCE = """
+    INSERT OR IGNORE INTO chef_id_sequence (id, last_value)
+    SELECT 1, COALESCE(MAX(CAST(SUBSTR(chef_id, 2) AS INTEGER)), 0)
+    FROM registered_chefs WHERE chef_id LIKE 'C%'
+"""
+NEXT_ID = "UPDATE chef_id_sequence SET last_value = last_value + 1 WHERE id = 1"
+RAISE_ID = "UPDATE chef_id_sequence SET last_value = MAX(last_value, ?) WHERE id = 1"
+SELECT_ID = "SELECT last_value FROM chef_id_sequence WHERE id = 1"
+INSERT_CHEF = """
+    INSERT INTO registered_chefs (chef_id, name, image_path, encoding, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+SELECT_ENCODINGS = "SELECT id, name, encoding FROM registered_chefs ORDER BY id"
+SELECT_ENCODINGS_AFTER = "SELECT id, name, encoding FROM registered_chefs WHERE id > ? ORDER BY id"
+UPDATE_ENCODING = "UPDATE registered_chefs SET encoding = ? WHERE id = ?"
+SELECT_STATS = "SELECT COUNT(*), MAX(id) FROM registered_chefs"
+SELECT_CHEF_IDS_AND_NAMES = "SELECT chef_id, name FROM registered_chefs"
+SELECT_CHEFS = "SELECT id, chef_id, name, image_path FROM registered_chefs ORDER BY id"
+NAME_EXISTS = "SELECT EXISTS (SELECT 1 FROM registered_chefs WHERE name = ?)"
+
+_local = threading.local()
+
+
+def _connect(db_path):
+    # Autocommit at the driver level; writes go through transaction() below
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                           isolation_level=None, cached_statements=CACHED_STATEMENTS)
+    conn.execute("PRAGMA journal_mode=WAL")   # readers no longer wait for a registering writer
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    try:
+        # Databases created before the index existed get it on first open
+        conn.execute(CREATE_NAME_INDEX)
+    except sqlite3.OperationalError:
+        pass  # table not created yet (init_db adds the index) or DB read-only
+    return conn
+
+
+def get_connection(db_path=DB_PATH):
+    """
+    Connection to `db_path` owned by the calling thread.
+
+    Connections are opened once per thread and reused, so the prepared
+    statement cache survives between requests. A forked worker never reuses
+    its parent's handles; it opens its own on first use.
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+    conn = _local.connections.get(db_path)
+    if conn is None:
+        conn = _local.connections[db_path] = _connect(db_path)
+    return conn
+
+
+def close_connections():
+    """Close this thread's connections (e.g. at the end of a CLI run)."""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+@contextmanager
+def transaction(db_path=DB_PATH):
+    """
+    Write transaction on the thread's connection.
+
+    BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue
+    on busy_timeout instead of failing when a read lock is upgraded.
+    Commits on success, rolls back on any exception.
+    """
+    conn = get_connection(db_path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def create_schema(db_path=DB_PATH):
+    conn = get_connection(db_path)
+    conn.execute(CREATE_REGISTERED_CHEFS)
+    conn.execute(CREATE_NAME_INDEX)
+    conn.execute(CREATE_ID_SEQUENCE)
+
+
+def format_chef_id(number):
+    return f"C{number:04d}"
+
+
+def _chef_id_number(chef_id):
+    match = re.fullmatch(r"C(\d+)", chef_id or "")
+    return int(match.group(1)) if match else None
+
+
+def allocate_chef_id(conn):
+    """
+    Next chef ID from the chef_id_sequence counter, inside an open transaction.
+
+    Constant time: one UPDATE of a single row. The counter is seeded once from
+    the highest existing ID. Because the caller's write transaction holds the
+    lock until its insert commits, concurrent registrations never share an ID;
+    a rolled-back registration also rolls its ID back.
+    """
+    _update_sequence(conn, NEXT_ID)
+    return format_chef_id(conn.execute(SELECT_ID).fetchone()[0])
+
+
+def _update_sequence(conn, sql, params=()):
+    # The counter row is seeded from the highest existing ID the first time only
+    conn.execute(CREATE_ID_SEQUENCE)
+    if conn.execute(sql, params).rowcount == 0:
+        conn.execute(SEED_ID_SEQUENCE)
+        conn.execute(sql, params)
+
+
+def _raise_id_sequence(conn, chef_ids):
+    # Rows inserted with explicit IDs (bulk import, db_handler) move the counter past them
+    numbers = [n for n in map(_chef_id_number, chef_ids) if n is not None]
+    if numbers:
+        _update_sequence(conn, RAISE_ID, (max(numbers),))
+
+
+def insert_chef_row(conn, chef_id, name, image_path, encoding_blob, timestamp):
+    """Insert one chef inside an open transaction; returns the new row id."""
+    row_id = conn.execute(INSERT_CHEF, (chef_id, name, image_path, encoding_blob, timestamp)).lastrowid
+    _raise_id_sequence(conn, [chef_id])
+    return row_id
+
+
+def insert_chef_rows(conn, rows):
+    """Insert (chef_id, name, image_path, encoding_blob, timestamp) rows inside an open transaction."""
+    conn.executemany(INSERT_CHEF, rows)
+    _raise_id_sequence(conn, [row[0] for row in rows])
+
+
+def fetch_encoding_rows(after_id=None, db_path=DB_PATH):
+    """(id, name, encoding) rows ordered by id, optionally only those after `after_id`."""
+    conn = get_connection(db_path)
+    if after_id is None:
+        return conn.execute(SELECT_ENCODINGS).fetchall()
+    return conn.execute(SELECT_ENCODINGS_AFTER, (after_id,)).fetchall()
+
+
+def table_stats(db_path=DB_PATH):
+    """(row count, max id) of registered_chefs."""
+    return get_connection(db_path).execute(SELECT_STATS).fetchone()
+
+
+def name_exists(name, db_path=DB_PATH, conn=None):
+    """Indexed lookup (idx_registered_chefs_name)."""
+    conn = conn or get_connection(db_path)
+    return bool(conn.execute(NAME_EXISTS, (name,)).fetchone()[0])
+
+
+def fetch_chef_ids_and_names(db_path=DB_PATH):
+    return get_connection(db_path).execute(SELECT_CHEF_IDS_AND_NAMES).fetchall()
+
+
+def fetch_chefs(db_path=DB_PATH):
+    """(id, chef_id, name, image_path) for every registered chef."""
+    return get_connection(db_path).execute(SELECT_CHEFS).fetchall()
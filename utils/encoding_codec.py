@@ -0,0 +1,81 @@
+import ast
+import json
+import re
+import numpy as np
+
+# Binary layout stored in registered_chefs.encoding:
+#   b"FENC" | version (1 byte) | dtype code (1 byte) | 2 reserved bytes | raw little-endian floats
+# The 8-byte header keeps the float payload 8-byte aligned for np.frombuffer.
+MAGIC = b"FENC"
+FORMAT_VERSION = 1
+HEADER_SIZE = 8
+DTYPE_CODES = {b"f": np.dtype("<f4"), b"d": np.dtype("<f8")}
+STORAGE_DTYPE = np.float64       # float64 keeps distances identical to the legacy text rows
+
+# numpy >= 2 renders list items as np.float64(...) in str(list(array))
+_NP_SCALAR_RE = re.compile(r"np\.float(?:16|32|64)\(([^()]*)\)")
+
+
+def encode_encoding(encoding, dtype=STORAGE_DTYPE):
+    """
+    Serialise a face encoding into the tagged binary column format.
+
+    Args:
+        encoding (array-like): 128-d face encoding.
+        dtype: np.float32 or np.float64 storage precision.
+
+    Returns:
+        bytes: header + raw little-endian payload.
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    for code, known in DTYPE_CODES.items():
+        if known == dtype:
+            break
+    else:
+        raise ValueError(f"Unsupported encoding dtype: {dtype}")
+
+    payload = np.ascontiguousarray(encoding, dtype=dtype).tobytes()
+    header = MAGIC + bytes([FORMAT_VERSION]) + code + b"\x00\x00"
+    return header + payload
+
+
+def is_binary_encoding(value):
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:4]) == MAGIC
+
+
+def decode_encoding(value):
+    """
+    Decode a stored encoding, accepting both the binary format and legacy text.
+
+    Binary rows are returned as a read-only np.frombuffer view (no copy).
+    Legacy rows (`str(list(encoding))` or JSON) are parsed once into float64.
+
+    Raises:
+        ValueError: if the value is not a recognisable encoding.
+    """
+    if isinstance(value, (bytes, memoryview)):
+        if not is_binary_encoding(value):
+            raise ValueError("Encoding blob has no FENC header.")
+        version = value[4]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported encoding format version: {version}")
+        dtype = DTYPE_CODES.get(bytes(value[5:6]))
+        if dtype is None:
+            raise ValueError("Unknown encoding dtype tag.")
+        return np.frombuffer(value, dtype=dtype, offset=HEADER_SIZE)
+
+    if isinstance(value, str):
+        return np.array(_parse_legacy_text(value), dtype=np.float64)
+
+    raise ValueError(f"Unsupported encoding column type: {type(value).__name__}")
+
+
+def _parse_legacy_text(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(_NP_SCALAR_RE.sub(r"\1", text))
+    except (ValueError, SyntaxError) as e:
+        raise ValueError(f"Malformed encoding text: {e}") from e
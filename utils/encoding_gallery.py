@@ -0,0 +1,269 @@
+import threading
+import numpy as np
+from utils.encoding_codec import decode_encoding
+from utils.face_matcher import MATCH_TOLERANCE, squared_norms, top_k_matches
+from utils.ann_index import ANN_MIN_GALLERY_SIZE, IVFIndex, ann_top_k_matches
+from utils import gallery_snapshot
+from utils.database import DB_PATH, fetch_encoding_rows, table_stats
+
+ENCODING_DIM = 128               # face_recognition encodings are 128-d
+USE_ANN_INDEX = True             # IVF search once the gallery reaches ANN_MIN_GALLERY_SIZE
+USE_SHARED_SNAPSHOT = True       # share one memory-mapped copy between worker processes
+
+
+class EncodingGallery:
+    """
+    Process-resident copy of every registered encoding.
+
+    Rows from `registered_chefs` are parsed once into a contiguous (N, 128)
+    matrix with parallel `ids` / `names` arrays, so recognition never touches
+    SQLite or re-parses encodings on the hot path. Registration keeps it fresh
+    through `add`; anything else that writes the table should `invalidate`.
+
+    With a `snapshot_dir` the matrix is memory-mapped from a published
+    snapshot (see gallery_snapshot), so every worker process shares one
+    page-cache copy and picks up new versions without restarting. Without
+    one, each access appends the rows committed after the newest cached id,
+    so registrations made by another process (e.g. the web process, for an
+    authorization job worker) are still seen.
+
+    Large galleries are searched through an IVF index that trains on a
+    background thread after each load; until it is ready `match` scans the
+    whole matrix. The index keeps the accept/reject decision of the full scan
+    but may return another chef within tolerance (see ann_top_k_matches).
+    """
+
+    def __init__(self, db_path=DB_PATH, snapshot_dir=None):
+        self.db_path = db_path
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+        self.encodings = np.empty((0, ENCODING_DIM), dtype=np.float64)
+        self.sq_norms = np.empty(0, dtype=np.float64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.names = np.empty(0, dtype=object)
+        self._index = None
+        self._build_thread = None
+
+    def __len__(self):
+        self.ensure_loaded()
+        return len(self.ids)
+
+    def ensure_loaded(self):
+        """Load the gallery on first use, or remap it when a newer snapshot is live."""
+        if self._loaded and not self._snapshot_changed():
+            if self.snapshot_dir is None:
+                self._append_committed_rows()
+            return
+        with self._lock:
+            if not self._loaded or self._snapshot_changed():
+                self._load()
+                self._ann_index()   # starts the IVF build now rather than on the first match
+
+    def _snapshot_changed(self):
+        return (self.snapshot_dir is not None
+                and gallery_snapshot.current_version(self.snapshot_dir) != self._version)
+
+    def _load(self):
+        # sqlite3.Error propagates so callers can map it to their DB status code
+        if self.snapshot_dir is not None:
+            snapshot = gallery_snapshot.open_snapshot(self.snapshot_dir)
+            if snapshot is not None and self._matches_db(snapshot):
+                self._set_arrays(snapshot["encodings"], snapshot["ids"], snapshot["names"])
+                self._version = snapshot["version"]
+                return
+
+        encodings, ids, names = self._decode_rows(self._fetch_rows())
+        self._set_arrays(encodings, ids, names)
+        if self.snapshot_dir is not None:
+            with gallery_snapshot.publish_lock(self.snapshot_dir):
+                self._version = gallery_snapshot.publish_snapshot(encodings, ids, names, self.snapshot_dir)
+            # Switch to the mapped copy so the private matrix can be freed
+            snapshot = gallery_snapshot.open_snapshot(self.snapshot_dir)
+            if snapshot is not None and snapshot["version"] == self._version:
+                self._set_arrays(snapshot["encodings"], snapshot["ids"], snapshot["names"])
+
+    def _append_committed_rows(self):
+        # One indexed query (id > newest cached id); usually returns nothing
+        rows = self._fetch_rows(int(self.ids.max()) if len(self.ids) else 0)
+        if not rows:
+            return
+        encodings, ids, names = self._decode_rows(rows)
+        with self._lock:
+            if not self._loaded:
+                return   # invalidated meanwhile; the next access reloads everything
+            newest = self.ids.max() if len(self.ids) else 0
+            new = ids > newest     # another thread or add() may have appended some already
+            if not new.any():
+                return
+            self._set_arrays(np.ascontiguousarray(np.vstack([self.encodings, encodings[new]])),
+                             np.concatenate([self.ids, ids[new]]),
+                             np.concatenate([self.names, names[new]]))
+
+    def _fetch_rows(self, after_id=None):
+        return fetch_encoding_rows(after_id, self.db_path)
+
+    def _matches_db(self, snapshot):
+        # A snapshot is usable only if it covers exactly the rows in the table
+        count, max_id = table_stats(self.db_path)
+        return count == snapshot["count"] and max_id == snapshot["max_id"]
+
+    @staticmethod
+    def _decode_rows(rows):
+        # ValueError propagates for malformed encodings
+        encodings = np.empty((len(rows), ENCODING_DIM), dtype=np.float64)
+        for i, (_, _, stored) in enumerate(rows):
+            encodings[i] = decode_encoding(stored)
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        names = np.array([row[1] for row in rows], dtype=object)
+        return encodings, ids, names
+
+    def _set_arrays(self, encodings, ids, names):
+        # A new version that only appends rows keeps the trained IVF index,
+        # so a remap after registration does not retrain on the next match
+        old_count = len(self.ids)
+        keep_index = (self._index is not None and len(ids) >= old_count
+                      and np.array_equal(ids[:old_count], self.ids))
+        self.encodings = encodings
+        self.sq_norms = squared_norms(encodings)
+        self.ids = ids
+        self.names = names
+        if keep_index:
+            self._index.extend(encodings[old_count:], old_count)
+        else:
+            self._index = None
+        self._loaded = True
+
+    def match(self, query, k=2, tolerance=MATCH_TOLERANCE):
+        """
+        Nearest registered chefs for `query` (see face_matcher.top_k_matches).
+
+        The result additionally carries the matching `ids` and `names`, and
+        `max_id`, the newest row the searched copy covers.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            encodings, sq_norms, ids, names = self.encodings, self.sq_norms, self.ids, self.names
+            index = self._ann_index()
+
+        if index is not None:
+            result = ann_top_k_matches(index, encodings, query, k=k, tolerance=tolerance, sq_norms=sq_norms)
+        else:
+            result = top_k_matches(encodings, query, k=k, tolerance=tolerance, sq_norms=sq_norms)
+        result["ids"] = [int(i) for i in ids[result["indices"]]]
+        result["names"] = list(names[result["indices"]])
+        result["max_id"] = int(ids.max()) if len(ids) else 0
+        return result
+
+    def _ann_index(self):
+        # Called with the lock held; never trains here (see _start_index_build)
+        if not USE_ANN_INDEX or len(self.ids) < ANN_MIN_GALLERY_SIZE:
+            return None
+        if self._index is None or self._index.needs_rebuild:
+            self._start_index_build()
+        return self._index
+
+    def _start_index_build(self):
+        # Called with the lock held. A thread started before a fork is not alive in the child
+        if self._build_thread is not None and self._build_thread.is_alive():
+            return
+        self._build_thread = threading.Thread(target=self._build_index, args=(self.encodings, self.ids),
+                                              name="ivf-index-build", daemon=True)
+        self._build_thread.start()
+
+    def _build_index(self, encodings, ids):
+        try:
+            index = IVFIndex().build(encodings)
+        except Exception as e:
+            print(f"[Gallery] IVF index build failed: {e}")
+            return
+        with self._lock:
+            # Install only if the live arrays still start with the rows it was trained on
+            count = len(ids)
+            if len(self.ids) >= count and np.array_equal(self.ids[:count], ids):
+                index.extend(self.encodings[count:], count)
+                self._index = index
+
+    def wait_for_index(self, timeout=None):
+        """Block until a running IVF build finishes (e.g. before forking workers)."""
+        thread = self._build_thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def add(self, row_id, name, encoding):
+        """Append a freshly registered chef without reloading the table."""
+        if self.snapshot_dir is not None:
+            self._publish_new_rows()
+            return
+
+        with self._lock:
+            if not self._loaded:
+                # Nothing cached yet; the next load picks the row up from the DB
+                return
+            encoding = np.asarray(encoding, dtype=np.float64).reshape(1, ENCODING_DIM)
+            self.encodings = np.ascontiguousarray(np.vstack([self.encodings, encoding]))
+            self.sq_norms = np.append(self.sq_norms, squared_norms(encoding))
+            self.ids = np.append(self.ids, np.int64(row_id))
+            self.names = np.append(self.names, np.array([name], dtype=object))
+
+            if self._index is not None:
+                self._index.add(encoding[0], len(self.ids) - 1)
+
+    def _publish_new_rows(self):
+        """
+        Publish a snapshot that adds every committed row newer than the live one.
+
+        Runs under the cross-process publish lock, so concurrent registrations
+        in different workers cannot drop each other's rows.
+        """
+        # self._lock is not held here: _load takes the two locks in the opposite order
+        with gallery_snapshot.publish_lock(self.snapshot_dir):
+            snapshot = gallery_snapshot.open_snapshot(self.snapshot_dir)
+            if snapshot is None:
+                encodings, ids, names = self._decode_rows(self._fetch_rows())
+            else:
+                new_enc, new_ids, new_names = self._decode_rows(self._fetch_rows(snapshot["max_id"] or 0))
+                encodings = np.vstack([snapshot["encodings"], new_enc])
+                ids = np.concatenate([snapshot["ids"], new_ids])
+                names = np.concatenate([snapshot["names"], new_names])
+            gallery_snapshot.publish_snapshot(encodings, ids, names, self.snapshot_dir)
+
+        # Remap the published file so this worker shares its pages as well
+        with self._lock:
+            self._load()
+
+    def refresh(self):
+        """Pick up rows another writer committed (e.g. a bulk import) in every worker."""
+        if self.snapshot_dir is not None:
+            self._publish_new_rows()
+        else:
+            self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached matrix; the next access reloads from the database."""
+        with self._lock:
+            self._loaded = False
+            self._version = None
+            self._index = None
+
+
+_gallery = None
+_gallery_lock = threading.Lock()
+
+
+def get_gallery(db_path=DB_PATH):
+    """Return the process-wide gallery for `db_path`, creating it if needed."""
+    global _gallery
+    if _gallery is None or _gallery.db_path != db_path:
+        with _gallery_lock:
+            if _gallery is None or _gallery.db_path != db_path:
+                snapshot_dir = gallery_snapshot.SNAPSHOT_DIR if USE_SHARED_SNAPSHOT else None
+                _gallery = EncodingGallery(db_path, snapshot_dir=snapshot_dir)
+    return _gallery
+
+
+def invalidate_gallery():
+    """Force the process-wide gallery to reload on its next access."""
+    if _gallery is not None:
+        _gallery.invalidate()
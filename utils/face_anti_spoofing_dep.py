@@ -1,52 +1,54 @@
 #imports
 import cv2
-import dlib
 import numpy as np
 import time
 import os
-from math import hypot
-import matplotlib.pyplot as plt
+import io
+from contextlib import contextmanager
 import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from utils.stage_timing import StageClock, count, span
+from utils.model_registry import get_detector, get_dlib, get_shape_predictor, warm_up
 
 ## Constraints ##
 VIDEO_DURATION = 10              # seconds to capture
 CAPTURE_FPS = 15                 # target fps
+REFERENCE_FPS = 30               # rate EAR_CONSEC_FRAMES and motion thresholds were tuned at
 EAR_THRESHOLD = 0.21             # Eye Aspect Ratio threshold for closed eye
-EAR_CONSEC_FRAMES = 2            # consecutive frames below EAR to count a blink
+EAR_CONSEC_FRAMES = 2            # consecutive frames below EAR to count a blink (at REFERENCE_FPS)
 MIN_BLINKS = 1                   # minimum blinks to consider liveness
 OPTICAL_FLOW_THRESH = 1.0        # avg optical flow magnitude threshold (tune)
+FLOW_MODE = "full"               # "full": dense on the whole frame, "roi": dense on the face box, "sparse": LK on landmarks
+OPTICAL_FLOW_THRESHOLDS = {      # avg_flow pass threshold per FLOW_MODE (calibrate with dev/bench_optical_flow.py)
+    "full": OPTICAL_FLOW_THRESH,
+    "roi": 3.0,                  # EXPERIMENTAL estimate: assumes the face covers ~15% of a 640x480 frame
+    "sparse": 6.0,               # EXPERIMENTAL estimate: landmark displacement in full-res pixels
+}
+CALIBRATED_FLOW_MODES = ("full",)   # modes whose threshold was measured on recorded live/spoof clips;
+                                    # add "roi"/"sparse" once bench_optical_flow has calibrated them
+FLOW_ROI_PAD = 0.25              # ROI = face box grown by this fraction per side
+FLOW_ROI_SIDE = 128              # ROI is downscaled to this longest side before Farneback
 HEAD_MOTION_THRESH = 0.01        # normalized motion threshold (fraction of face width)
 MIN_FACE_FRAMES = 6              # minimum frames containing a face to evaluate
-OUTPUT_FRAME_PATH = "data/images/temporary-outputs/best_frame.jpg"
-os.makedirs(os.path.dirname(OUTPUT_FRAME_PATH), exist_ok=True)
-
-# Path to dlib's 68-landmark model (download if you don't have it)
-SHAPE_PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
-if not os.path.exists(SHAPE_PREDICTOR_PATH):
-    raise FileNotFoundError(
-        f"Missing dlib shape predictor. Download from:\n"
-        "https://github.com/davisking/dlib-models/raw/master/shape_predictor_68_face_landmarks.dat.bz2\n"
-        "Unzip and place the .dat file at: " + SHAPE_PREDICTOR_PATH
-    )
-
-# dlib models
-detector = dlib.get_frontal_face_detector()
-predictor = dlib.shape_predictor(SHAPE_PREDICTOR_PATH)
-
-def euclidean(a, b):
-    return np.linalg.norm(np.array(a) - np.array(b))
-
-def eye_aspect_ratio(eye_points):
-    # eye_points: list of 6 (x,y) coords in order [p1,p2,p3,p4,p5,p6]
-    # EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||)
-    p1, p2, p3, p4, p5, p6 = eye_points
-    A = euclidean(p2, p6)
-    B = euclidean(p3, p5)
-    C = euclidean(p1, p4)
-    if C == 0:
-        return 0.0
-    ear = (A + B) / (2.0 * C)
-    return ear
+BLINK_WEIGHT = 0.6               # score weights used by decide_liveness
+FLOW_WEIGHT = 0.2
+HEAD_MOTION_WEIGHT = 0.2
+PASS_SCORE = 0.4                 # require at least some evidence; blink alone (0.6) would pass
+EARLY_EXIT = True                # stop analysing once the liveness decision cannot change
+EARLY_EXIT_CHECK_INTERVAL = 4    # frames between early-exit checks (each check scans the EAR series)
+LANDMARK_BUFFER_FRAMES = 320     # initial (N, 68, 2) landmark buffer; doubles if a clip is longer
+DETECTION_MAX_SIDE = 480         # HOG runs on a copy downscaled to this longest side (None = full res)
+FACE_LOCALISATION_MODE = "track" # "detect": HOG on every frame, "track": HOG on keyframes + correlation tracker
+REDETECT_INTERVAL = 10           # frames between forced re-detections in track mode
+TRACKER_MIN_CONFIDENCE = 7.0     # tracker peak-to-sidelobe ratio below this triggers a re-detect
+LIVENESS_WORKERS = int(os.environ.get("LIVENESS_WORKERS", min(4, os.cpu_count() or 1)))  # analysis processes (1 = serial loop)
+LIVENESS_CHUNK_FRAMES = 16       # contiguous frames per pool task; small so early exit skips work
+DEBUG_STAGE_TIMINGS = False      # add per-stage milliseconds ("stage_ms") to the liveness debug payload (client-visible)
+
+# dlib models (detector, 68-landmark predictor) load on first use, see utils/model_registry.py
 
 RIGHT_EYE_IDX = [36, 37, 38, 39, 40, 41]   # right eye (x6)
 LEFT_EYE_IDX  = [42, 43, 44, 45, 46, 47]   # left eye (x6)
@@ -54,166 +56,678 @@ NOSE_TIP_IDX = 30                          # nose tip index in dlib 68
 RIGHT_OUTER = 36                           # right outer eye corner (for face width)
 LEFT_OUTER = 45                            # left outer eye corner
 
-def video_bytes_to_frames(video_bytes, target_fps=CAPTURE_FPS):
+def video_bytes_to_frames(video_bytes, target_fps=CAPTURE_FPS, stream_info=None):
     """
-    Convert uploaded video bytes into a list of frames (BGR numpy arrays).
+    Decode uploaded video bytes lazily, yielding one BGR frame at a time.
+
+    Frames are not accumulated, so callers that consume the generator
+    incrementally keep peak memory independent of the clip length.
+
+    The stream is subsampled to `target_fps` using the container timestamps
+    (or the reported frame rate when timestamps are missing). Skipped frames
+    are only grabbed, never retrieved/converted. Pass a dict as `stream_info`
+    to receive source_fps, effective_fps, decoded/yielded frame counts and
+    decode_seconds (time spent inside the decoder, not in the consumer).
     """
-    # Write the uploaded bytes to a temporary file so OpenCV can read it
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as tmp:
-        tmp.write(video_bytes.read() if hasattr(video_bytes, "read") else video_bytes)
-        tmp_path = tmp.name
-
-    frames = []
-    cap = cv2.VideoCapture(tmp_path)
-    if not cap.isOpened():
-        os.remove(tmp_path)
-        raise RuntimeError("Could not open uploaded video.")
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame.copy())
-    cap.release()
-    os.remove(tmp_path)
-    return frames
-
-def analyze_frames_for_liveness(frames):
-    if len(frames) < 2:
-        return {"status": -1, "reason": "not_enough_frames"}
-
-    ear_list = []          # per-frame average EAR
-    blink_count = 0
-    ear_below = 0
-    nose_positions = []    # (x,y) per frame in pixels
-    face_bbox_areas = []   # area of face bbox per frame
-    gray_prev = None
-    flow_mags = []
+    if stream_info is None:
+        stream_info = {}
+
+    if hasattr(video_bytes, "read"):
+        video_bytes = video_bytes.read()
+
+    stream_info["decode_seconds"] = 0.0
+    decode_start = time.perf_counter()
+    with open_video_capture(video_bytes) as cap:
+        if not cap.isOpened():
+            raise RuntimeError("Could not open uploaded video.")
+
+        source_fps = cap.get(cv2.CAP_PROP_FPS)
+        if not 0 < source_fps <= 240:      # browser webm often reports 0 or 1000
+            source_fps = None
+        interval_ms = 1000.0 / target_fps if target_fps else 0.0
+
+        stream_info.update({
+            "source_fps": source_fps,
+            "effective_fps": min(target_fps, source_fps) if (target_fps and source_fps) else source_fps,
+            "decoded_frames": 0,
+            "yielded_frames": 0,
+        })
+
+        next_ms = 0.0
+        first_ms = last_ms = None
+        while cap.grab():
+            frame_idx = stream_info["decoded_frames"]
+            stream_info["decoded_frames"] += 1
+
+            t_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            if t_ms <= 0 and frame_idx > 0:
+                # No container timestamps: fall back to the nominal frame rate
+                t_ms = frame_idx * 1000.0 / source_fps if source_fps else None
+
+            if interval_ms and t_ms is not None:
+                if t_ms + 1.0 < next_ms:
+                    continue                # skipped: grabbed but never decoded to BGR
+                while next_ms <= t_ms + 1.0:
+                    next_ms += interval_ms
+
+            ret, frame = cap.retrieve()
+            if not ret:
+                continue
 
-    face_frames_idx = []   # indices where a face was found
-    face_widths = []
+            stream_info["yielded_frames"] += 1
+            if t_ms is not None:
+                first_ms = t_ms if first_ms is None else first_ms
+                last_ms = t_ms
+                if last_ms > first_ms:
+                    stream_info["effective_fps"] = (stream_info["yielded_frames"] - 1) * 1000.0 / (last_ms - first_ms)
+            stream_info["decode_seconds"] += time.perf_counter() - decode_start
+            yield frame
+            decode_start = time.perf_counter()
+        stream_info["decode_seconds"] += time.perf_counter() - decode_start
 
-    for idx, frame in enumerate(frames):
-        h, w = frame.shape[:2]
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-        # detect faces
-        dets = detector(gray, 0)
+@contextmanager
+def open_video_capture(video_bytes):
+    """
+    OpenCV capture that reads the upload straight from memory.
+
+    Uses the FFmpeg stream-reader API (OpenCV >= 4.10). Builds without it fall
+    back to a temporary file, placed on the RAM-backed /dev/shm when present.
+    """
+    cap = None
+    tmp_path = None
+    buffer = io.BytesIO(video_bytes)   # must outlive the capture
+    try:
+        try:
+            cap = cv2.VideoCapture(buffer, cv2.CAP_FFMPEG, [])
+        except (TypeError, SystemError, cv2.error):
+            cap = None
+
+        if cap is None or not cap.isOpened():
+            if cap is not None:
+                cap.release()
+            tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".webm", dir=tmp_dir) as tmp:
+                tmp.write(video_bytes)
+                tmp_path = tmp.name
+            cap = cv2.VideoCapture(tmp_path)
+        yield cap
+    finally:
+        if cap is not None:
+            cap.release()
+        if tmp_path is not None:
+            os.remove(tmp_path)
+
+
+def detect_faces(gray, max_side=DETECTION_MAX_SIDE):
+    """
+    Run the HOG face detector on a downscaled copy of `gray`.
+
+    Boxes are mapped back to full-resolution coordinates, so the landmark
+    predictor can still run on the original frame.
+    """
+    detector = get_detector()
+    h, w = gray.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return list(detector(gray, 0))
+
+    scale = max_side / float(max(h, w))
+    small = cv2.resize(gray, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+                       interpolation=cv2.INTER_AREA)
+    rectangle = get_dlib().rectangle
+    return [rectangle(int(round(d.left() / scale)), int(round(d.top() / scale)),
+                      int(round(d.right() / scale)), int(round(d.bottom() / scale)))
+            for d in detector(small, 0)]
+
+class FaceLocator:
+    """
+    Per-clip face localisation.
+
+    In "track" mode the HOG detector runs on a keyframe and the box is then
+    followed with dlib.correlation_tracker; a new detection happens every
+    `redetect_interval` frames or as soon as the tracker confidence drops.
+    """
+
+    def __init__(self, mode=None, redetect_interval=None, min_confidence=None):
+        self.mode = mode or FACE_LOCALISATION_MODE
+        self.redetect_interval = redetect_interval or REDETECT_INTERVAL
+        self.min_confidence = TRACKER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.tracker = None
+        self.frames_since_detect = 0
+        self.detector_calls = 0
+
+    def locate(self, gray):
+        """Return the face rectangle for this frame (full-resolution coords) or None."""
+        if self.mode != "track" or self.tracker is None or self.frames_since_detect >= self.redetect_interval:
+            return self._detect(gray)
+
+        confidence = self.tracker.update(gray)
+        if confidence < self.min_confidence:
+            return self._detect(gray)
+
+        self.frames_since_detect += 1
+        pos = self.tracker.get_position()
+        return get_dlib().rectangle(int(round(pos.left())), int(round(pos.top())),
+                                    int(round(pos.right())), int(round(pos.bottom())))
+
+    def _detect(self, gray):
+        self.detector_calls += 1
+        dets = detect_faces(gray, DETECTION_MAX_SIDE)
         if len(dets) == 0:
-            ear_list.append(None)
-            nose_positions.append(None)
-            face_bbox_areas.append(0)
-            continue
+            self.tracker = None
+            return None
+
+        face = dets[0]
+        if self.mode == "track":
+            self.tracker = get_dlib().correlation_tracker()
+            self.tracker.start_track(gray, face)
+            self.frames_since_detect = 0
+        return face
+
+def rect_to_face_location(rect, frame):
+    """dlib rectangle -> face_recognition (top, right, bottom, left), clipped to the frame."""
+    if rect is None or frame is None:
+        return None
+    h, w = frame.shape[:2]
+    return (max(0, rect.top()), min(w - 1, rect.right()),
+            min(h - 1, rect.bottom()), max(0, rect.left()))
+
+def ear_consec_frames_for_fps(fps, consec_frames=EAR_CONSEC_FRAMES):
+    """Scale the blink run-length (tuned at REFERENCE_FPS) to the sampled frame rate."""
+    if not fps:
+        return consec_frames
+    return max(1, int(round(consec_frames * fps / REFERENCE_FPS)))
+
+def eye_aspect_ratios(landmarks):
+    """Mean EAR of both eyes for every frame of an (N, 68, 2) landmark array."""
+    # (N, 2 eyes, 6 points, 2): both eyes in one pass
+    eyes = landmarks[:, [RIGHT_EYE_IDX, LEFT_EYE_IDX]]
+    def dist(i, j):
+        d = eyes[:, :, i] - eyes[:, :, j]
+        return np.hypot(d[..., 0], d[..., 1])
+    # EAR = (||p2-p6|| + ||p3-p5||) / (2 * ||p1-p4||), 0 where the eye has no width
+    a, b, c = dist(1, 5), dist(2, 4), dist(0, 3)
+    ears = np.zeros_like(c)
+    np.divide(a + b, 2.0 * c, out=ears, where=c != 0)
+    return ears.mean(axis=1)
+
+
+def count_blinks(ears, consec_frames, threshold=EAR_THRESHOLD, include_open_run=True):
+    """
+    Run-length blink count over an EAR series (NaN = frame without a face).
 
-        # take the first face
-        face_frames_idx.append(idx)
-        d = dets[0]
-        shape = predictor(gray, d)
-        coords = np.array([[pt.x, pt.y] for pt in shape.parts()])
+    A run of at least `consec_frames` closed-eye frames counts once the eye
+    reopens. A run cut short by a frame without a face is dropped. A run still
+    open at the end counts only with `include_open_run`.
+    """
+    closed = np.concatenate([[False], ears < threshold, [False]])    # NaN compares False
+    edges = np.flatnonzero(np.diff(closed.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    long_runs = (ends - starts) >= consec_frames
+    at_end = ends == len(ears)
+    reopened = np.zeros(len(ends), dtype=bool)
+    reopened[~at_end] = ~np.isnan(ears[ends[~at_end]])
+    count = int(np.count_nonzero(long_runs & reopened))
+    if include_open_run:
+        count += int(np.count_nonzero(long_runs & at_end))
+    return count
 
-        # helper to get pixel coords for an index
-        def lm(i):
-            return (int(coords[i][0]), int(coords[i][1]))
 
-        # compute EAR for both eyes if possible
-        try:
-            right_eye_pts = [lm(i) for i in RIGHT_EYE_IDX]
-            left_eye_pts  = [lm(i) for i in LEFT_EYE_IDX]
-            ear_r = eye_aspect_ratio(right_eye_pts)
-            ear_l = eye_aspect_ratio(left_eye_pts)
-            ear = (ear_r + ear_l) / 2.0
-        except Exception:
-            ear = None
-        ear_list.append(ear)
-
-        # nose tip
-        try:
-            nose = lm(NOSE_TIP_IDX)
-            nose_positions.append(nose)
-        except Exception:
-            nose_positions.append(None)
+def face_spans(landmarks):
+    """(N, 2) landmark bounding-box width/height, at least 1 px each."""
+    return np.maximum(1, landmarks.max(axis=1) - landmarks.min(axis=1))
 
-        # approximate face bbox area using coords
-        try:
-            xs = coords[:, 0]
-            ys = coords[:, 1]
-            x_min, x_max = int(xs.min()), int(xs.max())
-            y_min, y_max = int(ys.min()), int(ys.max())
-            face_width = max(1, x_max - x_min)
-            face_height = max(1, y_max - y_min)
-            area = face_width * face_height
-        except Exception:
-            area = 0
-            face_width = 1
-        face_bbox_areas.append(area)
-        face_widths.append(face_width)
+
+def face_area(coords):
+    """Area of the landmark bounding box; the largest face gives the best frame."""
+    width, height = np.maximum(1, coords.max(axis=0) - coords.min(axis=0))
+    return int(width * height)
+
+
+class LivenessAccumulator:
+    """
+    Blink / head-motion / optical-flow evidence for one clip.
+
+    Landmarks are written into a preallocated (N, 68, 2) buffer as frames
+    arrive; EAR, blinks, nose motion and bbox areas are then computed over the
+    whole buffer in a few NumPy operations. `decision_locked` reports when the
+    liveness decision can no longer change, and `metrics` produces the same
+    dict that decide_liveness consumes.
+    """
+
+    def __init__(self, stream_info=None, capacity=LANDMARK_BUFFER_FRAMES):
+        self.stream_info = stream_info if stream_info is not None else {}
+        self.landmarks = np.zeros((capacity, 68, 2), dtype=np.float64)
+        self.has_face = np.zeros(capacity, dtype=bool)
+        self._ears = np.full(capacity, np.nan)   # EAR cache, filled up to _ears_done
+        self._ears_done = 0
+        self.flow_mags = []
+        self.face_frames = 0
+        self.frames_count = 0
+        self.best_frame = None      # frame with the largest face bbox so far
+        self.best_idx = None
+        self.best_area = 0
+        self.best_face_rect = None  # detector/tracker box for best_frame
+
+    @property
+    def effective_fps(self):
+        return self.stream_info.get("effective_fps")
+
+    def _grow(self):
+        capacity = 2 * len(self.has_face)
+        landmarks = np.zeros((capacity, 68, 2), dtype=np.float64)
+        landmarks[:self.frames_count] = self.landmarks[:self.frames_count]
+        has_face = np.zeros(capacity, dtype=bool)
+        has_face[:self.frames_count] = self.has_face[:self.frames_count]
+        ears = np.full(capacity, np.nan)
+        ears[:self.frames_count] = self._ears[:self.frames_count]
+        self.landmarks, self.has_face, self._ears = landmarks, has_face, ears
+
+    def add_frame(self, idx, frame, coords=None, flow_mag=None, face_rect=None):
+        """
+        Record one analysed frame; `coords` is the (68, 2) landmark array or None
+        and `face_rect` the dlib rectangle the landmarks were predicted in.
+        """
+        if self.frames_count == len(self.has_face):
+            self._grow()
+        row = self.frames_count
+        self.frames_count += 1
+        if coords is None:
+            return
+
+        self.landmarks[row] = coords
+        self.has_face[row] = True
+        self.face_frames += 1
+        self.offer_best_frame(idx, frame, face_area(coords), face_rect)
+
+        if flow_mag is not None:
+            self.flow_mags.append(flow_mag)
+
+    def offer_best_frame(self, idx, frame, area, face_rect=None):
+        """Keep `frame` as the best frame if its face is the largest so far (frame=None is ignored)."""
+        if frame is not None and (self.best_frame is None or area > self.best_area):
+            self.best_frame, self.best_idx, self.best_area = frame, idx, area
+            self.best_face_rect = face_rect
+
+    def ear_series(self):
+        """EAR per frame so far, NaN where no face was found."""
+        start, n = self._ears_done, self.frames_count
+        if n > start:
+            # Only frames added since the last call are computed
+            face = self.has_face[start:n]
+            self._ears[start:n][face] = eye_aspect_ratios(self.landmarks[start:n][face])
+            self._ears_done = n
+        return self._ears[:n]
+
+    def decision_locked(self, min_blinks=MIN_BLINKS, min_face_frames=MIN_FACE_FRAMES):
+        """
+        True once further frames cannot change the outcome.
+
+        Blinks and face frames only ever increase, so once both minimums are met
+        the blink weight alone keeps the score at or above PASS_SCORE, whatever
+        the flow and head-motion averages do later.
+        """
+        if BLINK_WEIGHT < PASS_SCORE or self.face_frames < min_face_frames:
+            return False
+        consec_frames = ear_consec_frames_for_fps(self.effective_fps)
+        return count_blinks(self.ear_series(), consec_frames, include_open_run=False) >= min_blinks
+
+    def metrics(self):
+        if self.frames_count < 2:
+            return {"status": -1, "reason": "not_enough_frames", "frames_count": self.frames_count}
+
+        n = self.frames_count
+        face = self.has_face[:n]
+        landmarks = self.landmarks[:n]
+
+        effective_fps = self.effective_fps
+        ear_consec_frames = ear_consec_frames_for_fps(effective_fps)
+        # Per-pair motion grows with the frame interval; express it per reference frame
+        motion_scale = effective_fps / REFERENCE_FPS if effective_fps else 1.0
+        flow_mags = [m * motion_scale for m in self.flow_mags]
+
+        # blinks (including one still in progress at the end of the clip)
+        ears = self.ear_series()
+        blink_count = count_blinks(ears, ear_consec_frames)
+
+        # bbox areas (0 without a face) and face widths
+        spans = face_spans(landmarks)
+        areas = np.where(face, spans[:, 0] * spans[:, 1], 0).astype(int)
+
+        # head motion: nose displacement between consecutive face frames, normalized by mean face width
+        if self.face_frames >= 2:
+            nose = landmarks[:, NOSE_TIP_IDX]
+            disps = np.linalg.norm(nose[1:] - nose[:-1], axis=1)[face[1:] & face[:-1]]
+            mean_face_width = float(np.mean(spans[face, 0]))
+            normalized_nose_disp = float(np.mean(disps) / (mean_face_width + 1e-6)) if len(disps) else 0.0
+            normalized_nose_disp *= motion_scale
+        else:
+            normalized_nose_disp = 0.0
+
+        avg_flow = float(np.mean(flow_mags)) if flow_mags else 0.0
+        ear_list = [None if np.isnan(e) else float(e) for e in ears]
+
+        return {
+            "blink_count": blink_count,
+            "avg_ear": float(np.mean(ears[face])) if self.face_frames else None,
+            "avg_flow": avg_flow,
+            "normalized_nose_motion": normalized_nose_disp,
+            "face_frames_count": self.face_frames,
+            "face_bbox_areas": areas.tolist(),
+            "ear_series": ear_list,
+            "flow_series": flow_mags,
+            "frames_count": self.frames_count,
+            "effective_fps": effective_fps,
+            "ear_consec_frames": ear_consec_frames,
+            "best_frame_index": self.best_idx,
+            "best_frame": self.best_frame,
+            "best_face_location": rect_to_face_location(self.best_face_rect, self.best_frame),
+        }
+
+
+def landmarks(gray, rect):
+    """(68, 2) landmark coordinates inside a face rectangle."""
+    shape = get_shape_predictor()(gray, rect)
+    return np.fromiter((v for pt in shape.parts() for v in (pt.x, pt.y)),
+                       dtype=np.float64, count=136).reshape(68, 2)
+
+
+def flow_magnitude(gray_prev, gray, face_rect=None, coords_prev=None, mode=None):
+    """
+    Mean optical-flow magnitude between two grayscale frames, in full-resolution pixels.
+
+    Modes (default FLOW_MODE):
+        "full":   dense Farneback on the whole frame (3 levels, window 15).
+        "roi":    dense Farneback on the padded `face_rect`, downscaled to FLOW_ROI_SIDE.
+        "sparse": pyramidal Lucas-Kanade tracking of the previous frame's 68 landmarks.
+    Modes that lack their input (no face box / landmarks) fall back to "full".
+    """
+    mode = mode or FLOW_MODE
+    if mode == "sparse" and coords_prev is not None:
+        return _sparse_flow(gray_prev, gray, coords_prev)
+    if mode == "roi" and face_rect is not None:
+        return _roi_flow(gray_prev, gray, face_rect)
+
+    flow = cv2.calcOpticalFlowFarneback(gray_prev, gray,
+                                        None, 0.5, 3, 15, 3, 5, 1.2, 0)
+    mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
+    return float(np.mean(mag))
+
+
+def _roi_flow(gray_prev, gray, face_rect):
+    h, w = gray.shape[:2]
+    pad_x = int(FLOW_ROI_PAD * (face_rect.right() - face_rect.left()))
+    pad_y = int(FLOW_ROI_PAD * (face_rect.bottom() - face_rect.top()))
+    x0, x1 = max(0, face_rect.left() - pad_x), min(w, face_rect.right() + pad_x)
+    y0, y1 = max(0, face_rect.top() - pad_y), min(h, face_rect.bottom() + pad_y)
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        return 0.0
+
+    prev_roi, roi = gray_prev[y0:y1, x0:x1], gray[y0:y1, x0:x1]
+    scale = min(1.0, FLOW_ROI_SIDE / float(max(x1 - x0, y1 - y0)))
+    if scale < 1.0:
+        size = (max(8, int(round((x1 - x0) * scale))), max(8, int(round((y1 - y0) * scale))))
+        prev_roi = cv2.resize(prev_roi, size, interpolation=cv2.INTER_AREA)
+        roi = cv2.resize(roi, size, interpolation=cv2.INTER_AREA)
+
+    # Smaller pyramid and window: the ROI is ~FLOW_ROI_SIDE px, not a full frame
+    flow = cv2.calcOpticalFlowFarneback(prev_roi, roi, None, 0.5, 2, 9, 3, 5, 1.1, 0)
+    return float(np.mean(np.hypot(flow[..., 0], flow[..., 1]))) / scale
+
+
+def _sparse_flow(gray_prev, gray, coords_prev):
+    pts_prev = np.asarray(coords_prev, dtype=np.float32).reshape(-1, 1, 2)
+    pts, status, _ = cv2.calcOpticalFlowPyrLK(gray_prev, gray, pts_prev, None,
+                                              winSize=(15, 15), maxLevel=2)
+    tracked = status.reshape(-1) == 1
+    if not tracked.any():
+        return 0.0
+    disp = (pts - pts_prev).reshape(-1, 2)[tracked]
+    return float(np.mean(np.hypot(disp[:, 0], disp[:, 1])))
+
+
+def analyze_frames_for_liveness(frames, stream_info=None, early_exit=None, workers=None):
+    """
+    Compute liveness metrics from an iterable of BGR frames in a single pass.
+
+    Only the previous grayscale frame (for optical flow) and the current best
+    frame candidate are retained, so `frames` may be a streaming generator.
+    `stream_info` (filled by video_bytes_to_frames) supplies the sampled frame
+    rate used to rescale blink run-lengths and per-pair motion.
+
+    With `early_exit` (default EARLY_EXIT) the loop stops, and the decoder is
+    closed, as soon as the decision is locked; `frames_used` reports how many
+    frames were analysed.
+
+    With `workers` > 1 (default LIVENESS_WORKERS) the per-frame work runs on a
+    process pool in contiguous chunks (see analyze_frames_parallel).
+
+    `stage_seconds` reports the time spent in detection, landmarks and flow,
+    summed over the analysed frames.
+    """
+    if early_exit is None:
+        early_exit = EARLY_EXIT
+    if workers is None:
+        workers = LIVENESS_WORKERS
+    if workers > 1:
+        return analyze_frames_parallel(frames, stream_info, early_exit, workers)
+
+    acc = LivenessAccumulator(stream_info)
+    locator = FaceLocator()
+    clock = StageClock()
+    gray_prev = None
+    coords_prev = None
+    stopped_early = False
+
+    for idx, frame in enumerate(frames):
+        # locate the face (keyframe detection + tracking, or detection every frame)
+        with clock.span("liveness.detect"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            d = locator.locate(gray)
+        if d is None:
+            acc.add_frame(idx, frame)
+            continue
+
+        with clock.span("liveness.landmarks"):
+            coords = landmarks(gray, d)
 
         # optical flow between current and previous grayscale
+        mean_mag = None
         if gray_prev is not None:
-            flow = cv2.calcOpticalFlowFarneback(gray_prev, gray,
-                                                None, 0.5, 3, 15, 3, 5, 1.2, 0)
-            mag, ang = cv2.cartToPolar(flow[..., 0], flow[..., 1])
-            mean_mag = float(np.mean(mag))
-            flow_mags.append(mean_mag)
-        gray_prev = gray
-
-    # analyze EAR series for blinks
-    for e in ear_list:
-        if e is None:
-            ear_below = 0
+            with clock.span("liveness.flow"):
+                mean_mag = flow_magnitude(gray_prev, gray, face_rect=d, coords_prev=coords_prev)
+        gray_prev, coords_prev = gray, coords
+
+        acc.add_frame(idx, frame, coords, mean_mag, face_rect=d)
+        if early_exit and acc.frames_count % EARLY_EXIT_CHECK_INTERVAL == 0 and acc.decision_locked():
+            stopped_early = True
+            break
+
+    if stopped_early and hasattr(frames, "close"):
+        frames.close()   # stop decoding; releases the capture and temp file
+
+    metrics = acc.metrics()
+    metrics["flow_mode"] = FLOW_MODE
+    metrics["detector_calls"] = locator.detector_calls
+    metrics["frames_used"] = acc.frames_count
+    metrics["early_exit"] = stopped_early
+    metrics["stage_seconds"] = clock.seconds
+    return metrics
+
+
+def _analyze_chunk(start, bgr_frames):
+    """
+    Pool task: face box, landmarks and in-chunk optical flow for consecutive
+    frames. The first face frame of the chunk has no flow; the parent pairs it
+    with the last face frame of the chunk before. Only the chunk's best frame
+    (largest face) is sent back in colour.
+    """
+    locator = FaceLocator()
+    clock = StageClock()
+    results = []
+    gray_prev = coords_prev = None
+    first_face_gray = None
+    best = None
+    for offset, frame in enumerate(bgr_frames):
+        with clock.span("liveness.detect"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            d = locator.locate(gray)
+        if d is None:
+            results.append(None)
             continue
-        if e < EAR_THRESHOLD:
-            ear_below += 1
-        else:
-            if ear_below >= EAR_CONSEC_FRAMES:
-                blink_count += 1
-            ear_below = 0
-    # final check
-    if ear_below >= EAR_CONSEC_FRAMES:
-        blink_count += 1
-
-    # compute head motion by nose displacement normalized by mean face width
-    valid_noses = [p for p in nose_positions if p is not None]
-    if len(valid_noses) >= 2:
-        nose_disps = []
-        for i in range(1, len(nose_positions)):
-            if nose_positions[i] is None or nose_positions[i - 1] is None:
-                continue
-            d = euclidean(nose_positions[i], nose_positions[i - 1])
-            nose_disps.append(d)
-        mean_face_width = np.mean(face_widths) if face_widths else 1.0
-        if mean_face_width <= 0:
-            normalized_nose_disp = 0.0
+        with clock.span("liveness.landmarks"):
+            coords = landmarks(gray, d)
+        if gray_prev is None:
+            first_face_gray, mean_mag = gray, None
         else:
-            normalized_nose_disp = float(np.mean(nose_disps) / (mean_face_width + 1e-6)) if nose_disps else 0.0
-    else:
-        normalized_nose_disp = 0.0
-
-    avg_flow = float(np.mean(flow_mags)) if flow_mags else 0.0
-    face_frames_count = len(face_frames_idx)
-
-    metrics = {
-        "blink_count": blink_count,
-        "avg_ear": None if not ear_list else (np.nanmean([e for e in ear_list if e is not None]) if any(e is not None for e in ear_list) else None),
-        "avg_flow": avg_flow,
-        "normalized_nose_motion": normalized_nose_disp,
-        "face_frames_count": face_frames_count,
-        "face_bbox_areas": face_bbox_areas,
-        "ear_series": ear_list,
-        "flow_series": flow_mags,
+            with clock.span("liveness.flow"):
+                mean_mag = flow_magnitude(gray_prev, gray, face_rect=d, coords_prev=coords_prev)
+        gray_prev, coords_prev = gray, coords
+        rect = (d.left(), d.top(), d.right(), d.bottom())
+        results.append((coords, rect, mean_mag))
+
+        area = face_area(coords)
+        if best is None or area > best["area"]:
+            best = {"index": start + offset, "area": area, "rect": rect, "frame": frame}
+    return {
+        "start": start,
+        "frames": results,
+        "best": best,
+        "first_face_gray": first_face_gray,
+        "last_face_gray": gray_prev,
+        "detector_calls": locator.detector_calls,
+        "stage_seconds": clock.seconds,
     }
+
+
+def liveness_workers_for(processes):
+    """
+    LIVENESS_WORKERS for each of `processes` analyses running at once (e.g.
+    authorization job processes), so processes x workers stays within the cores.
+    """
+    return max(1, min(LIVENESS_WORKERS, (os.cpu_count() or 1) // max(1, processes)))
+
+
+_liveness_pool = None
+_liveness_pool_key = None        # (pid, workers) the pool was created for
+_liveness_pool_lock = threading.Lock()
+
+
+def _get_liveness_pool(workers):
+    # One pool per process; each worker process loads its own detector/predictor up front
+    global _liveness_pool, _liveness_pool_key
+    with _liveness_pool_lock:
+        if _liveness_pool is None or _liveness_pool_key != (os.getpid(), workers):
+            _liveness_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=partial(warm_up, recognition=False, gallery=False, label=None))
+            _liveness_pool_key = (os.getpid(), workers)
+        return _liveness_pool
+
+
+def analyze_frames_parallel(frames, stream_info=None, early_exit=True, workers=LIVENESS_WORKERS):
+    """
+    analyze_frames_for_liveness with the per-frame work spread over `workers` processes.
+
+    Frames are cut into LIVENESS_CHUNK_FRAMES contiguous chunks while they are
+    decoded and handed to the pool; at most `workers` + 1 chunks are in flight.
+    Besides those and the chunk being collected, the parent keeps only the best
+    frame (largest face) returned by the chunks merged so far, so peak memory
+    does not grow with the clip length. Results are merged in frame order into the same accumulator
+    the serial loop uses, and the flow pairs that straddle chunk boundaries are
+    computed here. Each chunk starts with a fresh detection, so in track mode
+    detector_calls is a little higher than in the serial loop. Early exit
+    cancels the chunks that have not started yet; the chunk it stops in still
+    offers its best frame, which may lie after the last frame counted.
+    `stage_seconds` adds up the time of every worker, so it can exceed the
+    wall-clock time of the call.
+    """
+    pool = _get_liveness_pool(workers)
+    acc = LivenessAccumulator(stream_info)
+    clock = StageClock()
+    pending = deque()               # futures, in frame order
+    state = {"prev_face_gray": None, "prev_face_coords": None, "detector_calls": 0}
+    max_in_flight = workers + 1     # every worker busy plus one chunk queued
+
+    def merge(future):
+        # Returns True once the decision is locked
+        result = future.result()
+        state["detector_calls"] += result["detector_calls"]
+        clock.merge(result["stage_seconds"])
+        best = result["best"]
+        if best is not None:
+            acc.offer_best_frame(best["index"], best["frame"], best["area"], get_dlib().rectangle(*best["rect"]))
+        for offset, item in enumerate(result["frames"]):
+            idx = result["start"] + offset
+            if item is None:
+                acc.add_frame(idx, None)
+                continue
+            coords, rect, mean_mag = item
+            face_rect = get_dlib().rectangle(*rect)
+            if mean_mag is None and state["prev_face_gray"] is not None:
+                with clock.span("liveness.flow"):
+                    mean_mag = flow_magnitude(state["prev_face_gray"], result["first_face_gray"],
+                                              face_rect=face_rect, coords_prev=state["prev_face_coords"])
+            state["prev_face_coords"] = coords
+            acc.add_frame(idx, None, coords, mean_mag, face_rect=face_rect)
+            if early_exit and acc.frames_count % EARLY_EXIT_CHECK_INTERVAL == 0 and acc.decision_locked():
+                return True
+        if result["last_face_gray"] is not None:
+            state["prev_face_gray"] = result["last_face_gray"]
+        return False
+
+    stopped_early = False
+    chunk, chunk_start = [], 0
+    for idx, frame in enumerate(frames):
+        chunk.append(frame)
+        if len(chunk) == LIVENESS_CHUNK_FRAMES:
+            pending.append(pool.submit(_analyze_chunk, chunk_start, chunk))
+            chunk, chunk_start = [], idx + 1
+
+        # Merge finished chunks in order; block only when enough are in flight
+        while pending and (pending[0].done() or len(pending) >= max_in_flight):
+            if merge(pending.popleft()):
+                stopped_early = True
+                break
+        if stopped_early:
+            break
+
+    if not stopped_early:
+        if chunk:
+            pending.append(pool.submit(_analyze_chunk, chunk_start, chunk))
+        while pending:
+            if merge(pending.popleft()):
+                stopped_early = True
+                break
+
+    if stopped_early:
+        for future in pending:
+            future.cancel()
+        if hasattr(frames, "close"):
+            frames.close()   # stop decoding; releases the capture and temp file
+
+    metrics = acc.metrics()
+    metrics["flow_mode"] = FLOW_MODE
+    metrics["detector_calls"] = state["detector_calls"]
+    metrics["frames_used"] = acc.frames_count
+    metrics["early_exit"] = stopped_early
+    metrics["stage_seconds"] = clock.seconds
     return metrics
 
 
 def decide_liveness(metrics,
                     min_blinks=MIN_BLINKS,
-                    flow_thresh=OPTICAL_FLOW_THRESH,
+                    flow_thresh=None,
                     head_motion_thresh=HEAD_MOTION_THRESH,
                     min_face_frames=MIN_FACE_FRAMES):
     # Quick checks
     if metrics["face_frames_count"] < min_face_frames:
         return -1, "not_enough_face_frames"
 
+    # avg_flow is only comparable to the threshold of the mode that produced it
+    if flow_thresh is None:
+        flow_thresh = OPTICAL_FLOW_THRESHOLDS[metrics.get("flow_mode", FLOW_MODE)]
+
     # Booleans
     blink_ok = metrics["blink_count"] >= min_blinks
     flow_ok = metrics["avg_flow"] >= flow_thresh
@@ -221,12 +735,11 @@ def decide_liveness(metrics,
 
     # Weighted scoring (tunable)
     score = 0.0
-    score += 0.6 * (1.0 if blink_ok else 0.0)    # blinks = strong evidence
-    score += 0.2 * (1.0 if flow_ok else 0.0)
-    score += 0.2 * (1.0 if head_motion_ok else 0.0)
+    score += BLINK_WEIGHT * (1.0 if blink_ok else 0.0)    # blinks = strong evidence
+    score += FLOW_WEIGHT * (1.0 if flow_ok else 0.0)
+    score += HEAD_MOTION_WEIGHT * (1.0 if head_motion_ok else 0.0)
 
     # threshold for pass
-    PASS_SCORE = 0.4   # require at least some evidence; blink alone (0.6) would pass
     passed = score >= PASS_SCORE
 
     debug = {
@@ -236,39 +749,66 @@ def decide_liveness(metrics,
         "score": score,
         "blink_count": metrics["blink_count"],
         "avg_flow": metrics["avg_flow"],
+        "flow_mode": metrics.get("flow_mode", FLOW_MODE),
         "normalized_nose_motion": metrics["normalized_nose_motion"],
-        "face_frames_count": metrics["face_frames_count"]
+        "face_frames_count": metrics["face_frames_count"],
+        "frames_used": metrics.get("frames_used", metrics.get("frames_count")),
+        "early_exit": metrics.get("early_exit", False),
     }
     if passed:
         return True, debug
     else:
         return False, debug
     
-def pick_best_frame_and_save(frames, metrics, out_path=OUTPUT_FRAME_PATH):
-    areas = metrics["face_bbox_areas"]
-    if not areas:
+def pick_best_frame(metrics):
+    """
+    Best frame for recognition, kept in memory.
+
+    Returns:
+        dict or None: "image" (RGB array, as face_recognition expects),
+        "face_location" (top, right, bottom, left) from the liveness loop and
+        "frame_index".
+    """
+    best_frame = metrics.get("best_frame")
+    if best_frame is None:
         return None
-    best_idx = int(np.argmax(areas))
-    best_frame = frames[best_idx]
-    cv2.imwrite(out_path, best_frame)
-    return out_path
+    return {
+        "image": cv2.cvtColor(best_frame, cv2.COLOR_BGR2RGB),
+        "face_location": metrics.get("best_face_location"),
+        "frame_index": metrics.get("best_frame_index"),
+    }
 
 def anti_spoofing_video_pipeline(video_stream):
-    # 1) Decode video into frames
+    if FLOW_MODE not in CALIBRATED_FLOW_MODES:
+        # The dev benchmarks call analyze_frames_for_liveness directly and may still use them
+        raise ValueError(f"FLOW_MODE {FLOW_MODE!r} has no calibrated threshold "
+                         f"(calibrated: {', '.join(CALIBRATED_FLOW_MODES)}); see dev/bench_optical_flow.py")
+    start = time.perf_counter()
+    # 1) Decode video lazily; frames are analysed as they are decoded
     if hasattr(video_stream, "read"):
         video_bytes = video_stream.read()
     else:
         video_bytes = video_stream
 
-    frames = video_bytes_to_frames(video_bytes)
-    if not frames:
-        return -1, None, {}, "no_frames"
-    
-    metrics = analyze_frames_for_liveness(frames)
-    decision, debug = decide_liveness(metrics)
+    stream_info = {}
+    frames = video_bytes_to_frames(video_bytes, target_fps=CAPTURE_FPS, stream_info=stream_info)
+    metrics = analyze_frames_for_liveness(frames, stream_info=stream_info)
+    if metrics.get("status") == -1:
+        reason = "no_frames" if metrics["frames_count"] == 0 else metrics["reason"]
+        record_liveness_timings(metrics, stream_info, start, "undecided")
+        return -1, None, metrics, reason
+
+    with span("liveness.decision"):
+        decision, debug = decide_liveness(metrics)
+    outcome = "live" if decision is True else ("spoof" if decision is False else "undecided")
+    stage_ms = record_liveness_timings(metrics, stream_info, start, outcome)
+    if DEBUG_STAGE_TIMINGS and isinstance(debug, dict):
+        debug["stage_ms"] = stage_ms
+
     if decision is True:
-        best = pick_best_frame_and_save(frames, metrics)
-        print("✅ Live detected. Best frame saved to:", best)
+        # The best frame and its face box go straight to recognition (no JPEG round-trip)
+        best = pick_best_frame(metrics)
+        print("✅ Live detected. Best frame index:", best["frame_index"])
         print("Debug:", debug)
         return True, best, metrics, debug
     elif decision is False:
@@ -277,9 +817,25 @@ def anti_spoofing_video_pipeline(video_stream):
     else:
         print("⚠️ Not enough face frames or error. Reason:", debug if isinstance(debug, str) else debug)
         return -1, None, metrics, debug
-    
+
+
+def record_liveness_timings(metrics, stream_info, start, outcome):
+    """Observe the per-stage totals of one clip and count its frames and decision; returns stage_ms."""
+    clock = StageClock()
+    clock.merge(metrics.get("stage_seconds", {}))
+    clock.add("liveness.decode", stream_info.get("decode_seconds", 0.0))
+    clock.add("liveness.total", time.perf_counter() - start)
+    clock.observe()
+
+    count("frames_total", stream_info.get("decoded_frames", 0), stage="decoded")
+    count("frames_total", stream_info.get("yielded_frames", 0), stage="sampled")
+    count("frames_total", metrics.get("frames_used", metrics.get("frames_count", 0)), stage="analysed")
+    count("liveness_decisions_total", decision=outcome)
+    return clock.as_ms()
+
 # Visualize metrics & debug (optional)
 def visualize_metrics(metrics):
+    import matplotlib.pyplot as plt   # only needed here; kept out of the app's import path
     plt.figure(figsize=(10,4))
     if metrics["ear_series"]:
         ears = [e if e is not None else np.nan for e in metrics["ear_series"]]
@@ -287,7 +843,7 @@ def visualize_metrics(metrics):
         plt.axhline(EAR_THRESHOLD, color='r', linestyle='--', label='EAR thresh')
     if metrics["flow_series"]:
         plt.plot(metrics["flow_series"], label="Optical flow mag")
-        plt.axhline(OPTICAL_FLOW_THRESH, color='g', linestyle='--', label='Flow thresh')
+        plt.axhline(OPTICAL_FLOW_THRESHOLDS[metrics.get("flow_mode", FLOW_MODE)], color='g', linestyle='--', label='Flow thresh')
     plt.legend()
     plt.title("EAR & Optical Flow over frames")
     plt.show()
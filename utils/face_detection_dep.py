@@ -1,23 +1,74 @@
-import face_recognition
+from utils.model_registry import get_face_recognition
+import numpy as np
+
+GOOD_FACE_SIZE = 160             # px (shorter side of the face box) considered full quality
+
+def load_image(image):
+    """Return an RGB array for a path / file-like object, or the array itself."""
+    if isinstance(image, np.ndarray):
+        return image
+    return get_face_recognition().load_image_file(image)
 
 def face_detection_pipeline(image_path):
     """
     Main pipeline for face detection and registration.
     
     Args:
-        image_path (str): Path to the image file.
+        image_path (str or np.ndarray): Path to the image file, or a decoded RGB image.
     
     Returns:
         np.ndarray or int: 128-d face encoding vector or status code.
     """
-    if not detects_faces(image_path):
+    result = detect_and_encode(image_path)
+    if isinstance(result, int):
+        return result  # -1: No face detected, -2: Encoding extraction failed
+
+    return result["encoding"]  # ✅ Return the full 128-d encoding
+
+
+def detect_and_encode(image_path):
+    """
+    Load the image once, detect faces once and encode the first face.
+
+    Args:
+        image_path (str or np.ndarray): Path to the image file, or a decoded RGB image.
+
+    Returns:
+        dict or int: encoding, face_location (top, right, bottom, left),
+        face_count, face_size (px) and quality (0-1), or -1 (no face) / -2
+        (encoding failed).
+    """
+    try:
+        image = load_image(image_path)
+        face_locations = get_face_recognition().face_locations(image)
+    except Exception as e:
+        print(f"[Face Detection Error] {e}")
+        return -1
+    if not face_locations:
         return -1  # No face detected
 
-    encoding = get_face_encoding(image_path)
-    if encoding is None:
+    try:
+        # Encode only the first face, reusing its box instead of detecting again
+        encodings = get_face_recognition().face_encodings(image, known_face_locations=face_locations[:1])
+    except Exception as e:
+        print(f"[Encoding Error] {e}")
+        return -2
+    if not encodings:
         return -2  # Encoding extraction failed
 
-    return encoding  # ✅ Return the full 128-d encoding
+    top, right, bottom, left = face_locations[0]
+    face_size = min(right - left, bottom - top)
+    quality = min(1.0, face_size / float(GOOD_FACE_SIZE))
+    if len(face_locations) > 1:
+        quality *= 0.5   # ambiguous: more than one person in the shot
+
+    return {
+        "encoding": encodings[0],
+        "face_location": face_locations[0],
+        "face_count": len(face_locations),
+        "face_size": int(face_size),
+        "quality": quality,
+    }
 
 
 def detects_faces(image_path):
@@ -25,14 +76,14 @@ def detects_faces(image_path):
     Detects if at least one face exists in the image.
     
     Args:
-        image_path (str): Path to the image file.
+        image_path (str or np.ndarray): Path to the image file, or a decoded RGB image.
     
     Returns:
         bool: True if face(s) found, False otherwise.
     """
     try:
-        image = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(image)
+        image = load_image(image_path)
+        face_locations = get_face_recognition().face_locations(image)
         return len(face_locations) > 0
     except Exception as e:
         print(f"[Face Detection Error] {e}")
@@ -44,14 +95,14 @@ def get_face_encoding(image_path):
     Returns the first face encoding from the image if available.
     
     Args:
-        image_path (str): Path to the image file.
+        image_path (str or np.ndarray): Path to the image file, or a decoded RGB image.
     
     Returns:
         numpy.ndarray or None: 128-d face encoding vector or None if not found.
     """
     try:
-        image = face_recognition.load_image_file(image_path)
-        encodings = face_recognition.face_encodings(image)
+        image = load_image(image_path)
+        encodings = get_face_recognition().face_encodings(image)
 
         if not encodings:
             return None
@@ -65,12 +116,13 @@ def get_face_encoding(image_path):
 if __name__ == "__main__":
     test_image_path = "data/images/known_faces/C0012_Rohit-Sharma.jpg"
 
-    result = face_detection_pipeline(test_image_path)
+    result = detect_and_encode(test_image_path)
     if isinstance(result, int):
         if result == -1:
             print("❌ No face detected in the image.")
         elif result == -2:
             print("❌ Face encoding extraction failed.")
     else:
-        print(f"✅ Face detected and encoded successfully.\nEncoding shape: {result.shape}")
-        #print(f"Encoding: {result}")
+        print(f"✅ Face detected and encoded successfully.\nEncoding shape: {result['encoding'].shape}")
+        print(f"Faces: {result['face_count']}, face size: {result['face_size']}px, quality: {result['quality']:.2f}")
+        #print(f"Encoding: {result['encoding']}")
@@ -0,0 +1,105 @@
+import numpy as np
+
+MATCH_TOLERANCE = 0.4            # same threshold as face_recognition.compare_faces(tolerance=0.4)
+QUERY_BATCH = 256                # queries per block in nearest_neighbours (bounds the M x N matrix)
+
+
+def squared_norms(encodings):
+    """Row-wise squared L2 norms of an (N, D) matrix."""
+    encodings = np.asarray(encodings, dtype=np.float64)
+    return np.einsum("ij,ij->i", encodings, encodings)
+
+
+def squared_distances(encodings, query, sq_norms=None):
+    """
+    Squared L2 distance from `query` to every row of `encodings` in one pass.
+
+    Uses ||a - q||^2 = ||a||^2 - 2 a.q + ||q||^2 so the gallery is touched by a
+    single matrix-vector product; pass precomputed `sq_norms` to skip ||a||^2.
+    """
+    encodings = np.asarray(encodings, dtype=np.float64)
+    query = np.asarray(query, dtype=np.float64)
+    if sq_norms is None:
+        sq_norms = squared_norms(encodings)
+    d2 = sq_norms - 2.0 * (encodings @ query) + float(query @ query)
+    np.maximum(d2, 0.0, out=d2)    # clamp tiny negatives from rounding
+    return d2
+
+
+def top_k_matches(encodings, query, k=2, tolerance=MATCH_TOLERANCE, sq_norms=None):
+    """
+    Find the k nearest encodings to `query`.
+
+    Candidates are ranked on the batched squared distances and then re-scored
+    exactly (||a - q||), so the tolerance decision matches face_distance.
+
+    Args:
+        encodings (np.ndarray): (N, 128) known encodings.
+        query (np.ndarray): 128-d encoding to match.
+        k (int): Number of neighbours to return.
+        tolerance (float): Maximum distance accepted as a match.
+        sq_norms (np.ndarray, optional): Precomputed squared norms of `encodings`.
+
+    Returns:
+        dict: indices, distances (ascending), matched, best_index,
+              best_distance and margin (second best - best, None if N < 2).
+    """
+    n = len(encodings)
+    if n == 0:
+        return {"indices": np.empty(0, dtype=np.int64), "distances": np.empty(0),
+                "matched": False, "best_index": None, "best_distance": None, "margin": None}
+
+    d2 = squared_distances(encodings, query, sq_norms)
+    k = max(1, min(k, n))
+    if k < n:
+        candidates = np.argpartition(d2, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    return rerank_candidates(encodings, query, candidates, k=k, tolerance=tolerance)
+
+
+def rerank_candidates(encodings, query, candidates, k=2, tolerance=MATCH_TOLERANCE):
+    """Exact distances for a candidate subset, sorted and cut to k (see top_k_matches)."""
+    candidates = np.asarray(candidates, dtype=np.int64)
+    if len(candidates) == 0:
+        return top_k_matches(encodings[:0], query, k=k, tolerance=tolerance)
+
+    query = np.asarray(query, dtype=np.float64)
+    distances = np.linalg.norm(np.asarray(encodings[candidates], dtype=np.float64) - query, axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    indices = candidates[order]
+    distances = distances[order]
+
+    best_distance = float(distances[0])
+    return {
+        "indices": indices,
+        "distances": distances,
+        "matched": best_distance <= tolerance,
+        "best_index": int(indices[0]),
+        "best_distance": best_distance,
+        "margin": float(distances[1] - distances[0]) if len(distances) > 1 else None,
+    }
+
+
+def nearest_neighbours(encodings, queries, sq_norms=None):
+    """
+    Exact nearest row of `encodings` for every row of `queries`, in one batch.
+
+    Returns:
+        (indices, distances): (M,) int64 and (M,) float64; empty gallery gives
+        indices of -1 and infinite distances.
+    """
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, 128)
+    if len(encodings) == 0 or len(queries) == 0:
+        return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), np.inf)
+
+    if sq_norms is None:
+        sq_norms = squared_norms(encodings)
+    indices = np.empty(len(queries), dtype=np.int64)
+    for start in range(0, len(queries), QUERY_BATCH):
+        block = queries[start:start + QUERY_BATCH]
+        d2 = sq_norms[None, :] - 2.0 * (block @ encodings.T)   # ||q||^2 does not change the argmin
+        indices[start:start + QUERY_BATCH] = np.argmin(d2, axis=1)
+    distances = np.linalg.norm(encodings[indices] - queries, axis=1)   # exact re-score
+    return indices, distances
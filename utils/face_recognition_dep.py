@@ -1,58 +1,60 @@
 import sqlite3
-import face_recognition
-import numpy as np
-import ast
-
-def face_recognition_pipeline(test_image_path):
-    # connect to the database
-    db_path = 'data/chefs.db'  # Update if your DB is elsewhere
+from utils.model_registry import get_face_recognition
+from utils.encoding_gallery import get_gallery
+from utils.face_matcher import MATCH_TOLERANCE
+from utils.stage_timing import count, span
+
+RECOGNITION_RESULTS = {-1: "db_error", -2: "load_error", -3: "no_face", -4: "no_match"}
+
+def face_recognition_pipeline(test_image, face_location=None):
+    """
+    Match a face against the registered chefs.
+
+    Args:
+        test_image (str or np.ndarray): Image path, or an RGB image already in memory.
+        face_location (tuple, optional): (top, right, bottom, left) of the face,
+            e.g. from the liveness loop; skips face detection when given.
+
+    Returns:
+        (chef_id, name) on a match, otherwise -1/-2/-3/-4 status codes.
+    """
+    with span("recognition.total"):
+        result = _recognize(test_image, face_location)
+    count("recognition_results_total", result=RECOGNITION_RESULTS.get(result, "match"))
+    return result
+
+
+def _recognize(test_image, face_location):
+    # Known encodings come from the process-resident gallery (parsed once)
+    gallery = get_gallery()
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-    except Exception:
+        with span("recognition.gallery_load"):
+            gallery.ensure_loaded()
+    except sqlite3.Error:
         return -1  # ❌ Failed to connect to DB
+    except Exception:
+        return -2  # ❌ Failed to load stored encodings
 
     try:
-        # Fetch id, name, image_path, and encoding
-        cursor.execute("SELECT id, name, image_path, encoding FROM registered_chefs")
-        rows = cursor.fetchall()
-
-        known_encodings = []
-        known_names = []
-        known_ids = []
-
-        for row in rows:
-            chef_id, name, image_path, encoding_str = row[0], row[1], row[2], row[3]
-
-            try:
-                # Convert stringified list to actual list and then to numpy array
-                encoding_list = ast.literal_eval(encoding_str)
-                encoding_np = np.array(encoding_list)
-                
-                known_encodings.append(encoding_np)
-                known_names.append(name)
-                known_ids.append(chef_id)
-            except Exception:
-                return -2  # ❌ Failed to load stored encodings
-
-        known_encodings = np.array(known_encodings)
-
-        # Load and encode test image
-        test_image = face_recognition.load_image_file(test_image_path)
-        test_encodings = face_recognition.face_encodings(test_image)
+        # Load and encode test image (reuse the known face box when we have one)
+        with span("recognition.encode"):
+            if isinstance(test_image, str):
+                test_image = get_face_recognition().load_image_file(test_image)
+            known_locations = [tuple(face_location)] if face_location is not None else None
+            test_encodings = get_face_recognition().face_encodings(test_image, known_face_locations=known_locations)
 
         if not test_encodings:
             return -3  # ❌ No face found in test image
 
         test_encoding = test_encodings[0]
 
-        results = face_recognition.compare_faces(known_encodings, test_encoding, tolerance=0.4)
-        distances = face_recognition.face_distance(known_encodings, test_encoding)
+        # Single distance pass over the gallery; best match decides
+        with span("recognition.match"):
+            match = gallery.match(test_encoding, tolerance=MATCH_TOLERANCE)
 
-        if True in results:
-            best_match_index = np.argmin(distances)
-            chef_id = known_ids[best_match_index]
-            name = known_names[best_match_index]
+        if match["matched"]:
+            chef_id = match["ids"][0]
+            name = match["names"][0]
             return chef_id, name  # ✅ Match found
         else:
             return -4  # ❌ No match found
@@ -60,9 +62,6 @@ def face_recognition_pipeline(test_image_path):
     except Exception:
         return -2  # ❌ Failed during encoding/comparison
 
-    finally:
-        conn.close()
-
 
 if __name__ == "__main__":
     test_image_path = "data/images/test/test.jpg"
@@ -1,10 +1,19 @@
-import ast
+import io
 import os
 import sqlite3
-import face_recognition
+from utils.model_registry import get_face_recognition
 import numpy as np
 from datetime import datetime
-from utils.face_detection_dep import  face_detection_pipeline
+from utils.face_detection_dep import  detect_and_encode
+from utils.encoding_gallery import get_gallery
+from utils.encoding_codec import encode_encoding, decode_encoding
+from utils.face_matcher import MATCH_TOLERANCE
+from utils.database import DB_PATH, SELECT_ENCODINGS_AFTER, allocate_chef_id, insert_chef_row, name_exists, transaction
+from utils.stage_timing import count, span
+
+KNOWN_FACES_DIR = os.path.join("data", "images", "known_faces")
+REGISTRATION_RESULTS = {1: "registered", -1: "no_face", -2: "encoding_failed",
+                        -3: "db_error", -4: "duplicate", -5: "insert_error"}
 
 def extract_info_from_filename(filename):
     base = os.path.splitext(filename)[0]
@@ -14,94 +23,143 @@ def extract_info_from_filename(filename):
         chef_id, name = "Unknown", base
     return chef_id, name.replace('_', ' ')
 
-def check_matching(cursor, name, test_encoding):
-    
+def check_matching(conn, name, test_encoding):
+    """
+    Duplicate check for a new registration.
+
+    The name lookup uses the name index, and faces are searched in the
+    in-memory gallery (the same matcher recognition uses). Rows committed
+    after the gallery copy was taken are read through `conn`, so inside the
+    registration's write transaction the check sees every existing chef.
+
+    Returns:
+        (status, nearest): -4 for a duplicate name or face, otherwise 1.
+        `nearest` is {"id", "name", "distance"} for the closest registered
+        face, or None (duplicate name, or nothing registered yet).
+    """
     # Check if chef name already exists to avoid duplicates
-    cursor.execute("SELECT COUNT(*) FROM registered_chefs WHERE name = ?", (name,))
-    if cursor.fetchone()[0] > 0:
-        return -4  # Code for duplicate entry
+    if name_exists(name, conn=conn):
+        return -4, None  # Code for duplicate entry
 
     # check with encodings
-    # Fetch id, name, image_path, and encoding
-    cursor.execute("SELECT id, name, image_path, encoding FROM registered_chefs")
-    rows = cursor.fetchall()
-    known_encodings = []
-    known_names = []
-
-    for row in rows:
-        chef_id, name, image_path, encoding_str = row[0], row[1], row[2], row[3]
-            
+    match = get_gallery().match(test_encoding, k=1, tolerance=MATCH_TOLERANCE)
+    nearest = None
+    if match["best_index"] is not None:
+        nearest = {"id": match["ids"][0], "name": match["names"][0], "distance": match["best_distance"]}
+
+    # Rows another worker committed but has not published to the gallery yet
+    rows = conn.execute(SELECT_ENCODINGS_AFTER, (match["max_id"],)).fetchall()
+    for row_id, row_name, stored_encoding in rows:
         try:
-            # Convert stringified list to actual list and then to numpy array
-            encoding_list = ast.literal_eval(encoding_str)
-            encoding_np = np.array(encoding_list)
-                
-            known_encodings.append(encoding_np)
-            known_names.append(name)
+            # Binary rows decode without copying; legacy text rows are parsed
+            distance = float(np.linalg.norm(decode_encoding(stored_encoding) - test_encoding))
         except Exception as e:
-            print(f"Failed to load encoding for {name}: {e}")
+            print(f"Failed to load encoding for {row_name}: {e}")
+            continue
+        if nearest is None or distance < nearest["distance"]:
+            nearest = {"id": row_id, "name": row_name, "distance": distance}
 
-    known_encodings = np.array(known_encodings)
-    results = face_recognition.compare_faces(known_encodings, test_encoding, tolerance=0.4)
-    distances = face_recognition.face_distance(known_encodings, test_encoding)
+    if nearest is not None and nearest["distance"] <= MATCH_TOLERANCE:
+        return -4, nearest  # duplicate entry
+    return 1, nearest  # No duplicate found
 
-    print("Results:", results)
-    print("Distances:", distances)
 
-    if True in results:
-        best_match_index = np.argmin(distances)
-        name = known_names[best_match_index]
-        return -4 # duplicate entry
-    else:
-        return 1  # No duplicate found
+def face_registration_pipeline(image_path=None, image_bytes=None, name=None, image_dir=KNOWN_FACES_DIR):
+    """
+    Register the chef described by `image_path` (CHEFID_First-Last.jpg).
 
+    With `image_bytes` the upload is decoded in memory and written to
+    `image_path` only once the chef is accepted, just before the commit;
+    otherwise the image is read from `image_path`.
 
+    With `name` (and `image_bytes`) the Chef ID is allocated inside the insert
+    transaction and the image is saved as `image_dir/CHEFID_<name>.jpg`.
+    """
+    with span("registration.total"):
+        result = _register(image_path, image_bytes, name, image_dir)
+    count("registration_results_total", result=REGISTRATION_RESULTS.get(result, "unknown"))
+    return result
 
 
-def face_registration_pipeline(image_path):
-    # Connect to the database
-    db_path = 'data/chefs.db'  # Changed from ../data for consistency
-    if not os.path.exists(db_path):
+def _register(image_path, image_bytes, name, image_dir):
+    # The shared connection layer would create an empty file; refuse instead
+    if not os.path.exists(DB_PATH):
         return -3
 
+    # Decode in-memory uploads once; detection works on the array
+    image = image_path
+    if image_bytes is not None:
+        try:
+            with span("registration.decode"):
+                image = get_face_recognition().load_image_file(io.BytesIO(image_bytes))
+        except Exception as e:
+            print(f"[Image Decode Error] {e}")
+            return -1
+
+    # Perform face detection and encoding in one pass
+    with span("registration.detect_encode"):
+        detection = detect_and_encode(image)
+    if isinstance(detection, int):  # -1: No face, -2: Encoding failure
+        return detection
+    encoding = detection["encoding"]
+    if detection["face_count"] > 1 or detection["quality"] < 1.0:
+        print(f"[Registration] face_count={detection['face_count']} "
+              f"face_size={detection['face_size']}px quality={detection['quality']:.2f}")
+
+    # Extract metadata from filename, unless the ID is allocated below
+    chef_id = None
+    if name is None:
+        chef_id, name = extract_info_from_filename(os.path.basename(image_path))
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-    except Exception as e:
+        # Duplicate check and insert share one write transaction, so two
+        # concurrent registrations of the same chef cannot both pass the check
+        # (registration.transaction includes the lock wait and the commit)
+        with span("registration.transaction"), transaction(DB_PATH) as conn:
+            with span("registration.duplicate_check"):
+                match, nearest = check_matching(conn, name, encoding)
+            if nearest is not None:
+                print(f"[Registration] nearest registered face: {nearest['name']} "
+                      f"(distance={nearest['distance']:.3f})")
+
+            if match == -4:
+                return -4
+
+            with span("registration.insert"):
+                # The counter row stays locked until commit, so concurrent
+                # registrations cannot draw the same ID
+                if chef_id is None:
+                    chef_id = allocate_chef_id(conn)
+                    image_path = os.path.join(image_dir, f"{chef_id}_{name}.jpg")
+
+                # Insert into DB
+                row_id = insert_chef_row(
+                    conn,
+                    chef_id,
+                    name,
+                    image_path,
+                    encode_encoding(encoding),  # tagged little-endian float BLOB
+                    datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                )
+
+                # Persist the accepted image; a failed write rolls the row back
+                if image_bytes is not None:
+                    os.makedirs(os.path.dirname(image_path) or ".", exist_ok=True)
+                    with open(image_path, "wb") as f:
+                        f.write(image_bytes)
+    except sqlite3.OperationalError as e:
         print(f"[DB Error] {e}")
         return -3
-
-    # Perform face detection and encoding
-    encoding = face_detection_pipeline(image_path)
-    if isinstance(encoding, int):  # -1: No face, -2: Encoding failure
-        return encoding
-
-    # Extract metadata from filename
-    try:
-        chef_id, name = extract_info_from_filename(os.path.basename(image_path))
-        match = check_matching(cursor,name, encoding)
-
-        if match == -4:
-            return -4
-        
-        # Insert into DB
-        cursor.execute("""
-            INSERT INTO registered_chefs (chef_ID, name, image_path, encoding, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        """, (
-            chef_id,
-            name,
-            image_path,
-            str(list(encoding)),  # storing encoding as stringified list
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        ))
-        conn.commit()
-        return 1  # Success
     except Exception as e:
         print(f"[Insert Error] {e}")
         return -5
-    finally:
-        conn.close()
+
+    # Keep the recognition gallery in sync with the table
+    try:
+        get_gallery().add(row_id, name, encoding)
+    except Exception as e:
+        print(f"[Gallery Refresh Error] {e}")
+        get_gallery().invalidate()
+    return 1  # Success
 
 if __name__ == "__main__":
     image_path = "data/images/temp/C0013_Mahendar-Byra.jpg"
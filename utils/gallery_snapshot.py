@@ -0,0 +1,134 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing is not serialised across processes
+    fcntl = None
+
+# On-disk layout (one directory shared by every worker):
+#   CURRENT                      -> name of the live version, swapped with os.replace
+#   encodings-<version>.npy      -> (N, 128) float64 matrix, opened with mmap_mode="r"
+#   meta-<version>.json          -> ids / names sidecar plus row count and max id
+SNAPSHOT_DIR = "data/gallery-snapshot"
+POINTER_FILE = "CURRENT"
+LOCK_FILE = "publish.lock"
+KEEP_VERSIONS = 2                # older files are removed; open maps stay valid on POSIX
+
+
+def _encodings_path(snapshot_dir, version):
+    return os.path.join(snapshot_dir, f"encodings-{version}.npy")
+
+
+def _meta_path(snapshot_dir, version):
+    return os.path.join(snapshot_dir, f"meta-{version}.json")
+
+
+def _write_atomic(path, write):
+    """Write through a temp file in the same directory, fsync, then rename over `path`."""
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def publish_lock(snapshot_dir=SNAPSHOT_DIR):
+    """Serialise publishers across processes (best effort where fcntl is missing)."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    with open(os.path.join(snapshot_dir, LOCK_FILE), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def current_version(snapshot_dir=SNAPSHOT_DIR):
+    """Name of the live snapshot version, or None if nothing was published yet."""
+    try:
+        with open(os.path.join(snapshot_dir, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_snapshot(encodings, ids, names, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Export a gallery to disk and make it the live version.
+
+    Data files are written under a fresh version name first; only then is the
+    CURRENT pointer replaced, so readers never observe a half-written snapshot.
+
+    Returns:
+        str: The published version name.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    version = f"{time.time_ns()}-{os.getpid()}"
+    ids = [int(i) for i in ids]
+
+    encodings = np.ascontiguousarray(encodings, dtype=np.float64)
+    _write_atomic(_encodings_path(snapshot_dir, version), lambda f: np.save(f, encodings))
+    meta = {
+        "version": version,
+        "count": len(ids),
+        "max_id": max(ids) if ids else None,
+        "ids": ids,
+        "names": [str(n) for n in names],
+    }
+    _write_atomic(_meta_path(snapshot_dir, version),
+                  lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    _write_atomic(os.path.join(snapshot_dir, POINTER_FILE),
+                  lambda f: f.write(version.encode("utf-8")))
+
+    _remove_old_versions(snapshot_dir, keep=version)
+    return version
+
+
+def open_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """
+    Map the live snapshot read-only.
+
+    Returns:
+        dict or None: version, encodings (np.memmap), ids, names, count, max_id.
+    """
+    version = current_version(snapshot_dir)
+    if version is None:
+        return None
+    try:
+        with open(_meta_path(snapshot_dir, version), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        encodings = np.load(_encodings_path(snapshot_dir, version), mmap_mode="r")
+    except FileNotFoundError:
+        # Pointer moved on and the old files were cleaned up in between
+        return None
+
+    meta["encodings"] = encodings
+    meta["ids"] = np.array(meta["ids"], dtype=np.int64)
+    meta["names"] = np.array(meta["names"], dtype=object)
+    return meta
+
+
+def _remove_old_versions(snapshot_dir, keep):
+    versions = set()
+    for filename in os.listdir(snapshot_dir):
+        if filename.startswith("encodings-") and filename.endswith(".npy"):
+            versions.add(filename[len("encodings-"):-len(".npy")])
+
+    def sort_key(version):
+        return int(version.split("-", 1)[0])
+
+    stale = sorted(versions - {keep}, key=sort_key)[:-(KEEP_VERSIONS - 1) or None]
+    for version in stale:
+        for path in (_encodings_path(snapshot_dir, version), _meta_path(snapshot_dir, version)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped on Windows; removed on a later publish
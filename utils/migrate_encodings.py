@@ -0,0 +1,69 @@
+import argparse
+import os
+import numpy as np
+from utils.encoding_codec import encode_encoding, decode_encoding, is_binary_encoding
+from utils.database import DB_PATH, SELECT_ENCODINGS, UPDATE_ENCODING, close_connections, get_connection, transaction
+
+
+def migrate_encodings_to_blob(db_path=DB_PATH, dtype=np.float64, vacuum=True):
+    """
+    Rewrite every text-encoded row of registered_chefs into the binary BLOB format.
+
+    Rows that are already binary are left untouched, so the migration is safe
+    to re-run. Rows are read and rewritten in a single BEGIN IMMEDIATE
+    transaction on the shared connection (WAL, busy_timeout), so it can run
+    while the app is serving.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        dtype: Storage precision for the rewritten rows (np.float32 or np.float64).
+        vacuum (bool): Reclaim the freed pages afterwards.
+
+    Returns:
+        dict: Counts of converted / skipped / failed rows and file sizes.
+    """
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"❌ Database not found: {db_path}")
+
+    size_before = os.path.getsize(db_path)
+    updates = []
+    skipped = 0
+    failed = []
+    with transaction(db_path) as conn:
+        for row_id, name, stored in conn.execute(SELECT_ENCODINGS).fetchall():
+            if is_binary_encoding(stored):
+                skipped += 1
+                continue
+            try:
+                updates.append((encode_encoding(decode_encoding(stored), dtype=dtype), row_id))
+            except ValueError as e:
+                failed.append((row_id, name, str(e)))
+        conn.executemany(UPDATE_ENCODING, updates)
+    if vacuum and updates:
+        get_connection(db_path).execute("VACUUM")   # cannot run inside a transaction
+
+    return {
+        "converted": len(updates),
+        "skipped": skipped,
+        "failed": failed,
+        "size_before": size_before,
+        "size_after": os.path.getsize(db_path),
+    }
+
+
+if __name__ == "__main__":
+    # Run from project root:
+    #   python -m utils.migrate_encodings [--db data/chefs.db] [--dtype float32]
+    parser = argparse.ArgumentParser(description="Convert stored face encodings to binary BLOBs.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database path")
+    parser.add_argument("--dtype", choices=["float32", "float64"], default="float64",
+                        help="storage precision (float64 keeps matching results identical)")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM after rewriting")
+    args = parser.parse_args()
+
+    report = migrate_encodings_to_blob(args.db, dtype=np.dtype(args.dtype), vacuum=not args.no_vacuum)
+    close_connections()
+    print(f"✅ Converted {report['converted']} rows, {report['skipped']} already binary.")
+    for row_id, name, reason in report["failed"]:
+        print(f"❌ Row {row_id} ({name}) left unchanged: {reason}")
+    print(f"Database size: {report['size_before']} -> {report['size_after']} bytes")
@@ -0,0 +1,114 @@
+"""
+Models shared by the pipelines, loaded on first use.
+
+Importing the pipelines does not touch any model: dlib, the HOG detector, the
+68-landmark shape predictor (~100 MB) and face_recognition (whose import loads
+its own models) are loaded the first time they are asked for, or all at once by
+`warm_up()`. Every load is timed for the startup report.
+
+Usage (from project root):
+    python -m utils.model_registry      # load everything and print the report
+"""
+import importlib
+import os
+import threading
+import time
+import numpy as np
+
+from utils.encoding_gallery import get_gallery
+
+# Path to dlib's 68-landmark model (download if you don't have it)
+SHAPE_PREDICTOR_PATH = "shape_predictor_68_face_landmarks.dat"
+SHAPE_PREDICTOR_URL = "https://github.com/davisking/dlib-models/raw/master/shape_predictor_68_face_landmarks.dat.bz2"
+
+_models = {}
+_load_seconds = {}               # model name -> seconds its first load took in this process
+_lock = threading.RLock()        # loaders nest (the predictor loads dlib first)
+
+
+def _get(name, loader):
+    model = _models.get(name)
+    if model is None:
+        with _lock:
+            if name not in _models:
+                start = time.perf_counter()
+                _models[name] = loader()
+                _load_seconds[name] = time.perf_counter() - start
+            model = _models[name]
+    return model
+
+
+def _load_shape_predictor():
+    if not os.path.exists(SHAPE_PREDICTOR_PATH):
+        raise FileNotFoundError(
+            f"Missing dlib shape predictor. Download from:\n{SHAPE_PREDICTOR_URL}\n"
+            "Unzip and place the .dat file at: " + SHAPE_PREDICTOR_PATH
+        )
+    return get_dlib().shape_predictor(SHAPE_PREDICTOR_PATH)
+
+
+def get_dlib():
+    return _get("dlib", lambda: importlib.import_module("dlib"))
+
+
+def get_detector():
+    """dlib HOG frontal face detector."""
+    return _get("detector", lambda: get_dlib().get_frontal_face_detector())
+
+
+def get_shape_predictor():
+    """dlib 68-landmark predictor; raises FileNotFoundError if the .dat file is missing."""
+    return _get("shape_predictor", _load_shape_predictor)
+
+
+def get_face_recognition():
+    """The face_recognition module (its detector and encoder models load on import)."""
+    return _get("face_recognition", lambda: importlib.import_module("face_recognition"))
+
+
+def load_seconds():
+    """Seconds each model took to load in this process (only models loaded so far)."""
+    return dict(_load_seconds)
+
+
+def warm_up(liveness=True, recognition=True, gallery=True, label="Models"):
+    """
+    Load the models now instead of on the first request.
+
+    `liveness` loads the dlib detector and shape predictor, `recognition` loads
+    face_recognition and runs it once on a blank image, and `gallery` loads the
+    registered encodings and waits for their IVF index, if the gallery is large
+    enough to use one. Prints "<label> ready in ..." with the time of each
+    step (label=None stays quiet) and returns those times in seconds.
+    """
+    start = time.perf_counter()
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    if liveness:
+        get_detector()(blank[:, :, 0], 0)
+        get_shape_predictor()
+    if recognition:
+        # First calls allocate dlib's buffers; do it here rather than in a request
+        face_recognition = get_face_recognition()
+        face_recognition.face_locations(blank)
+        face_recognition.face_encodings(blank, known_face_locations=[(0, 63, 63, 0)])
+
+    report = load_seconds()
+    if gallery:
+        gallery_start = time.perf_counter()
+        try:
+            encoding_gallery = get_gallery()
+            encoding_gallery.ensure_loaded()
+            encoding_gallery.wait_for_index()
+        except Exception as e:
+            print(f"[Warm-up] gallery load failed: {e}")
+        report["gallery"] = time.perf_counter() - gallery_start
+    report["total"] = time.perf_counter() - start
+
+    if label:
+        steps = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report.items() if name != "total")
+        print(f"✅ {label} ready in {report['total']:.2f}s ({steps})")
+    return report
+
+
+if __name__ == "__main__":
+    warm_up()
@@ -0,0 +1,365 @@
+"""
+Per-stage timing spans and outcome counters for the pipelines.
+
+Stages are timed with `span("recognition.match")`, or with a StageClock when
+a stage repeats per frame and only its total per request is observed. Counts
+go through `count("frames_total", n, stage="decoded")`. Everything lands in a
+process-wide registry that `render_prometheus()` serialises for /metrics.
+
+Pool processes (authorization jobs) wrap their work in `capture()`. The
+events are returned with the result and replayed in the web process with
+`record_events()`, so /metrics covers work done outside the web process.
+
+Forked web workers (app.server) share their registries through a directory
+(`share_metrics()`): each worker writes its histograms and counters to its
+own file, /metrics sums every file, and the parent folds the file of an
+exited worker into a retired total, so counters never go backwards when
+workers are recycled.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRIC_PREFIX = "face_auth"
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)          # histogram upper bounds, seconds
+METRIC_HELP = {
+    "stage_seconds": "Time spent per pipeline stage.",
+    "frames_total": "Video frames per stage (decoded, sampled, analysed).",
+    "liveness_decisions_total": "Liveness decisions (live, spoof, undecided).",
+    "recognition_results_total": "Recognition outcomes.",
+    "registration_results_total": "Registration outcomes.",
+    "authorizations_total": "Authorization requests by HTTP status.",
+    "authorization_jobs_pending": "Authorization jobs queued or running.",
+}
+
+## Sharing between forked web workers ##
+METRICS_DIR = "data/metrics"     # one registry file per worker process
+METRICS_FLUSH_SECONDS = 1.0      # how often a worker writes its registry while idle
+RETIRED_FILE = "retired.json"    # summed registries of workers that have exited
+RETIRED_KEEP_NAMES = 64          # folded file names remembered, so a scrape never counts one twice
+
+
+class MetricsRegistry:
+    """Thread-safe histograms (one series per stage), counters and gauges."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}    # stage -> {"buckets": per-bucket counts, "sum", "count"}
+        self._counters = {}      # (name, sorted label items) -> value
+        self._gauges = {}
+        self.changes = 0         # bumped on every update; unchanged registries are not rewritten
+
+    def observe(self, stage, seconds):
+        i = bisect_left(self.buckets, seconds)
+        with self._lock:
+            hist = self._histograms.get(stage)
+            if hist is None:
+                hist = self._histograms[stage] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            if i < len(self.buckets):
+                hist["buckets"][i] += 1
+            hist["sum"] += seconds
+            hist["count"] += 1
+            self.changes += 1
+
+    def inc(self, name, value=1, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self.changes += 1
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._gauges[(name, tuple(sorted((labels or {}).items())))] = value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+            self.changes += 1
+
+    def state(self):
+        """Histograms and counters as JSON-serialisable data (gauges stay per process)."""
+        with self._lock:
+            return {
+                "histograms": {stage: dict(hist, buckets=list(hist["buckets"])) for stage, hist in self._histograms.items()},
+                "counters": [[name, [list(item) for item in labels], value] for (name, labels), value in self._counters.items()],
+            }
+
+    def merge(self, state):
+        """Add the histograms and counters of another registry's `state()`."""
+        with self._lock:
+            for stage, other in state.get("histograms", {}).items():
+                hist = self._histograms.get(stage)
+                if hist is None:
+                    hist = self._histograms[stage] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                hist["buckets"] = [a + b for a, b in zip(hist["buckets"], other["buckets"])]
+                hist["sum"] += other["sum"]
+                hist["count"] += other["count"]
+            for name, labels, value in state.get("counters", []):
+                key = (name, tuple(tuple(item) for item in labels))
+                self._counters[key] = self._counters.get(key, 0) + value
+            self.changes += 1
+
+    def gauges(self):
+        with self._lock:
+            return dict(self._gauges)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            histograms = {stage: dict(hist, buckets=list(hist["buckets"])) for stage, hist in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+
+        lines = []
+        if histograms:
+            name = f"{METRIC_PREFIX}_stage_seconds"
+            lines += [f"# HELP {name} {METRIC_HELP['stage_seconds']}", f"# TYPE {name} histogram"]
+            for stage in sorted(histograms):
+                hist = histograms[stage]
+                cumulative = 0
+                for bound, n in zip(self.buckets, hist["buckets"]):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(stage=stage, le=_number(bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(stage=stage, le='+Inf')} {hist['count']}")
+                lines.append(f"{name}_sum{_labels(stage=stage)} {_number(hist['sum'])}")
+                lines.append(f"{name}_count{_labels(stage=stage)} {hist['count']}")
+        lines += _render_series(counters, "counter")
+        lines += _render_series(gauges, "gauge")
+        return "\n".join(lines) + "\n"
+
+
+def _render_series(series, kind):
+    lines = []
+    for metric in sorted({name for name, _ in series}):
+        name = f"{METRIC_PREFIX}_{metric}"
+        lines.append(f"# HELP {name} {METRIC_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (series_name, labels), value in sorted(series.items(), key=lambda item: item[0]):
+            if series_name == metric:
+                lines.append(f"{name}{_labels(**dict(labels))} {_number(value)}")
+    return lines
+
+
+def _labels(**labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REGISTRY = MetricsRegistry()
+_capture = threading.local()
+
+
+def observe(stage, seconds):
+    """Record one duration for `stage` (captured instead while inside capture())."""
+    events = getattr(_capture, "events", None)
+    if events is not None:
+        events.append(("observe", stage, seconds, None))
+    else:
+        REGISTRY.observe(stage, seconds)
+
+
+def count(name, value=1, **labels):
+    """Add `value` to the counter `name` with `labels`."""
+    events = getattr(_capture, "events", None)
+    if events is not None:
+        events.append(("count", name, value, labels))
+    else:
+        REGISTRY.inc(name, value, labels)
+
+
+def set_gauge(name, value, **labels):
+    REGISTRY.set_gauge(name, value, labels)
+
+
+@contextmanager
+def span(stage):
+    """Time the block as one observation of `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+class StageClock:
+    """
+    Seconds per stage summed over one request, e.g. detection over all the
+    frames of a clip. `observe()` records each total as a single observation.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def merge(self, seconds):
+        for stage, value in seconds.items():
+            self.add(stage, value)
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def observe(self):
+        for stage, seconds in self.seconds.items():
+            observe(stage, seconds)
+
+    def as_ms(self):
+        return {stage: round(1000.0 * seconds, 2) for stage, seconds in self.seconds.items()}
+
+
+@contextmanager
+def capture():
+    """
+    Collect this thread's observations and counts as a list of events instead
+    of recording them. Used in pool processes, whose registry nobody scrapes.
+    """
+    previous = getattr(_capture, "events", None)
+    events = _capture.events = []
+    try:
+        yield events
+    finally:
+        _capture.events = previous
+
+
+def record_events(events):
+    """Replay events from capture() (e.g. returned by a pool process) into this process."""
+    for kind, name, value, labels in events or ():
+        if kind == "observe":
+            observe(name, value)
+        else:
+            count(name, value, **labels)
+
+
+def render_prometheus():
+    """/metrics body; with share_metrics() it covers every worker, live and exited."""
+    if _shared_dir is None:
+        return REGISTRY.render()
+    flush_metrics()
+    total = MetricsRegistry(REGISTRY.buckets)
+    for state in _shared_states():
+        total.merge(state)
+    for (name, labels), value in REGISTRY.gauges().items():
+        total.set_gauge(name, value, dict(labels))
+    return total.render()
+
+
+_shared_dir = None
+_flush_lock = threading.Lock()
+_flushed_changes = None
+_worker_path = None              # this process's file; named after pid and start time, as pids get reused
+_worker_pid = None
+
+
+def share_metrics(directory=METRICS_DIR, reset=False):
+    """
+    Write this process's registry to `directory` and read every worker's file
+    when rendering. The parent calls it with reset=True before forking, so
+    each server run starts from zero.
+    """
+    global _shared_dir, _flushed_changes
+    os.makedirs(directory, exist_ok=True)
+    if reset:
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                os.remove(os.path.join(directory, filename))
+    _shared_dir = directory
+    _flushed_changes = None
+
+
+def _read_state(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_state(path, state):
+    # Write-then-rename, so a scrape never reads a half-written file
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def flush_metrics():
+    """Write this process's registry to its shared file if it changed since the last write."""
+    global _flushed_changes, _worker_path, _worker_pid
+    if _shared_dir is None:
+        return
+    with _flush_lock:
+        if _worker_pid != os.getpid():
+            _worker_pid = os.getpid()
+            _worker_path = os.path.join(_shared_dir, f"worker-{_worker_pid}-{time.time_ns()}.json")
+            _flushed_changes = None
+        changes = REGISTRY.changes
+        if changes != _flushed_changes:
+            _write_state(_worker_path, REGISTRY.state())
+            _flushed_changes = changes
+
+
+def start_metrics_flusher(interval=METRICS_FLUSH_SECONDS):
+    """Flush in the background, e.g. counts recorded when an authorization job finishes."""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush_metrics()
+            except OSError as e:
+                print(f"[Metrics] flush failed: {e}")
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+
+def _shared_states():
+    # Worker files first, then the retired total: a file folded in between is
+    # listed in "absorbed" and skipped, so it is counted exactly once
+    workers = []
+    for filename in sorted(os.listdir(_shared_dir)):
+        if filename.startswith("worker-") and filename.endswith(".json"):
+            state = _read_state(os.path.join(_shared_dir, filename))
+            if state is not None:
+                workers.append((filename, state))
+    retired = _read_state(os.path.join(_shared_dir, RETIRED_FILE)) or {}
+    absorbed = set(retired.get("absorbed", []))
+    return [retired] + [state for filename, state in workers if filename not in absorbed]
+
+
+def retire_metrics(pid):
+    """Fold the file of exited worker `pid` into the retired total (called by the parent)."""
+    if _shared_dir is None:
+        return
+    names = [filename for filename in os.listdir(_shared_dir)
+             if filename.startswith(f"worker-{pid}-") and filename.endswith(".json")]
+    if not names:
+        return
+    retired_path = os.path.join(_shared_dir, RETIRED_FILE)
+    retired = _read_state(retired_path) or {}
+    total = MetricsRegistry(REGISTRY.buckets)
+    total.merge(retired)
+    for filename in names:
+        total.merge(_read_state(os.path.join(_shared_dir, filename)) or {})
+    merged = total.state()
+    merged["absorbed"] = (retired.get("absorbed", []) + names)[-RETIRED_KEEP_NAMES:]
+    _write_state(retired_path, merged)
+    for filename in names:
+        os.remove(os.path.join(_shared_dir, filename))